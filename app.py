@@ -3,11 +3,15 @@ warnings.filterwarnings('ignore', message='.*torch.classes.*')
 
 import streamlit as st
 import logging
+import time
+import uuid
 from datetime import datetime
 from core.config import Config
 from core.task_processor import TaskProcessor
 from core.todoist_client import TodoistClient
-from core.rag_engine import RAGEngine
+from core.rag_engine import get_shared_engine
+from core.job_queue import JobQueue, JobWorkerPool, set_job_components
+from core.metrics import start_metrics_server, start_trace
 
 logging.basicConfig(
     filename=Config.LOG_FILE,
@@ -27,18 +31,38 @@ def init_session_state():
         st.session_state.processor = None
     if 'todoist_client' not in st.session_state:
         st.session_state.todoist_client = None
+    if 'client_id' not in st.session_state:
+        # Idempotency scope: repeated submissions from this browser session are deduplicated
+        st.session_state.client_id = uuid.uuid4().hex
         
+@st.cache_resource(show_spinner=False)
+def load_components():
+    """One warmed engine, processor and Todoist client per server process, shared by all sessions"""
+    rag = get_shared_engine()
+    rag.start_watching()
+    start_metrics_server()
+    return TaskProcessor(rag_engine=rag), TodoistClient()
+
+@st.cache_resource(show_spinner=False)
+def load_job_queue():
+    """Job queue plus this server's worker pool, when JOB_QUEUE_ENABLED"""
+    if not Config.JOB_QUEUE_ENABLED:
+        return None
+    processor, todoist_client = load_components()
+    set_job_components(processor, todoist_client)
+    JobWorkerPool().start()
+    return JobQueue()
+
 def load_sop():
     try:
-        rag = RAGEngine()
-        chunks = rag.load_sop('data/sop_expenses.txt')
+        processor, todoist_client = load_components()
 
         # Inject dependency properly
-        st.session_state.processor = TaskProcessor(rag_engine=rag)
-        st.session_state.todoist_client = TodoistClient()
+        st.session_state.processor = processor
+        st.session_state.todoist_client = todoist_client
 
         st.session_state.rag_loaded = True
-        return True, chunks
+        return True, processor.rag_engine.readiness()["chunks"]
 
     except Exception as e:
         return False, str(e)
@@ -71,6 +95,30 @@ def main():
         st.session_state.processor = TaskProcessor()
         st.session_state.todoist_client = TodoistClient()
     
+    with st.sidebar:
+        st.subheader("Knowledge Base")
+        st.json(st.session_state.processor.rag_engine.readiness())
+        st.subheader("Answer Cache")
+        st.json(st.session_state.processor.answer_cache.stats())
+        st.subheader("Query Cache")
+        st.json(st.session_state.processor.rag_engine.query_cache.stats())
+        st.subheader("LLM Calls Skipped (no relevant SOP)")
+        st.write(st.session_state.processor.skipped_llm_calls)
+        st.subheader("Context Packing")
+        st.json(st.session_state.processor.context_packer.stats())
+        st.subheader("Fast Parse")
+        st.json(st.session_state.processor.fast_classifier.stats())
+        st.subheader("Speculative Retrieval")
+        st.json(st.session_state.processor.speculation)
+        st.subheader("Groq Limiter")
+        st.json(st.session_state.processor.llm.stats())
+        if st.session_state.processor.idempotency is not None:
+            st.subheader("Duplicate Requests")
+            st.json(st.session_state.processor.idempotency.stats())
+        if load_job_queue() is not None:
+            st.subheader("Job Queue")
+            st.json(load_job_queue().stats())
+
     # Main interface
     tab1, tab2 = st.tabs(["Create Task", "Ask SOP Question"])
     
@@ -107,57 +155,80 @@ def main():
 def process_task_request(request: str):
     """Process task creation request with SOP enrichment"""
 
+    start_trace()
+    job_queue = load_job_queue()
+    if job_queue is not None:
+        process_queued_request(job_queue, request)
+        return
+
     with st.expander("Processing Logs", expanded=True):
 
-        # Step 1: Parse request
+        processor = st.session_state.processor
+
+        # Step 1: Parse request and search SOP (single retrieval pass)
         st.write(f"{datetime.now().strftime('%H:%M:%S')} - Parsing request...")
-        parsed = st.session_state.processor.parse_request(request)
-        st.json(parsed)
+        result = processor.prepare_task(request, scope=request_scope())
+        if result.duplicate == "pending":
+            st.warning("This request is already being processed")
+            return
+        if result.duplicate:
+            st.info("This request was already processed; showing the task created earlier")
+            show_task_summary(result.task, result.enriched_description)
+            return
+        # Released if the script stops before create_task settles it (error or rerun)
+        with processor.holding_claim(result):
+            st.json(result.parsed)
 
-        # Step 2: Search SOP
-        st.write(f"{datetime.now().strftime('%H:%M:%S')} - Searching SOP knowledge base...")
-        st.write(f"Query: {parsed['category']} - {parsed['title']}")
+            st.write(f"{datetime.now().strftime('%H:%M:%S')} - Searching SOP knowledge base...")
+            st.write(f"Query: {result.parsed['category']} - {result.parsed['title']}")
 
-        sop_chunks = st.session_state.processor.rag_engine.query(
-            f"{parsed['category']} {parsed['title']}",
-            n_results=3
-        )
+            # Use container instead of expander
+            st.subheader("Retrieved SOP Chunks")
+            sop_container = st.container()
 
-        # Use container instead of expander
-        st.subheader("Retrieved SOP Chunks")
-        sop_container = st.container()
+            if result.sop_chunks:
+                with sop_container:
+                    for i, chunk in enumerate(result.sop_chunks):
+                        section = chunk['metadata'].get('section_path') or "untitled section"
+                        distance = "keyword match" if chunk['distance'] is None else f"distance {chunk['distance']:.3f}"
+                        st.text(
+                            f"Chunk {i+1} [{section}] ({distance}): "
+                            f"{chunk['document'][:200]}..."
+                        )
+            else:
+                st.warning("No relevant SOP found, the task will be created without SOP reminders")
 
-        if sop_chunks:
-            with sop_container:
-                for i, chunk in enumerate(sop_chunks):
-                    st.text(f"Chunk {i+1}: {chunk[:200]}...")
-        else:
-            st.warning("No relevant SOP found")
+            # Step 2: Generate enriched description from the retrieved chunks
+            st.write(f"{datetime.now().strftime('%H:%M:%S')} - Generating task description...")
 
-        # Step 3: Generate enriched description
-        st.write(f"{datetime.now().strftime('%H:%M:%S')} - Generating task description...")
-        enriched_desc = st.session_state.processor.enrich_with_sop(parsed)
+            # Another container; tokens are rendered as Groq streams them
+            st.subheader("Generated SOP-Enriched Description")
+            st.write_stream(processor.stream_enrichment(result))
+            enriched_desc = result.enriched_description
 
-        # Another container
-        st.subheader("Generated SOP-Enriched Description")
-        st.write(enriched_desc)
+            # Step 3: Create Todoist task
+            st.write(f"{datetime.now().strftime('%H:%M:%S')} - Creating Todoist task...")
 
-        # Step 4: Create Todoist task
-        st.write(f"{datetime.now().strftime('%H:%M:%S')} - Creating Todoist task...")
-
-        try:
-            task = st.session_state.todoist_client.create_task(parsed, enriched_desc)
-            st.write(
-                f"{datetime.now().strftime('%H:%M:%S')} - Task created successfully: ID {task['id']}"
-            )
-        except Exception as e:
-            st.error(f"Failed to create task: {str(e)}")
-            logging.error("Todoist creation failed", exc_info=True)
+            processor.create_task(result, st.session_state.todoist_client)
+        if result.error:
+            st.error(f"Failed to create task: {result.error}")
             return
 
+        task = result.task
+        st.write(
+            f"{datetime.now().strftime('%H:%M:%S')} - Task created successfully: ID {task['id']}"
+        )
+        st.write(f"Stage timings (s), trace {result.trace_id}:")
+        st.json(result.timings)
+
     # Final summary (outside expander)
     st.success("Task Created Successfully in Todoist")
+    show_task_summary(task, enriched_desc)
+
+def request_scope() -> str:
+    return f"streamlit:{st.session_state.client_id}"
 
+def show_task_summary(task: dict, enriched_desc: str):
     col1, col2 = st.columns(2)
 
     with col1:
@@ -171,13 +242,41 @@ def process_task_request(request: str):
         st.subheader("SOP-Enriched Description")
         st.write(enriched_desc)
 
+def process_queued_request(job_queue: JobQueue, request: str):
+    """Enqueue the request and wait for a worker to finish it"""
+    job_id = job_queue.enqueue("task", {"message": request, "scope": request_scope()})
+    deadline = time.monotonic() + Config.JOB_RESULT_TIMEOUT_SECONDS
+
+    with st.status(f"Job #{job_id} queued", expanded=True) as status:
+        job = job_queue.get(job_id)
+        while job["status"] not in ("done", "dead") and time.monotonic() < deadline:
+            status.update(label=f"Job #{job_id} {job['status']} (attempt {job['attempts']})")
+            time.sleep(Config.JOB_POLL_INTERVAL_SECONDS)
+            job = job_queue.get(job_id)
+
+        if job["status"] == "dead":
+            status.update(label=f"Job #{job_id} failed", state="error")
+            st.error(f"Failed to create task after {job['attempts']} attempts: {job['error']}")
+            return
+        if job["status"] != "done":
+            status.update(label=f"Job #{job_id} still {job['status']}", state="running")
+            st.info(f"Job #{job_id} is still in the queue; it will complete in the background.")
+            return
+
+        result = job["result"]
+        status.update(label=f"Job #{job_id} done", state="complete")
+        st.json(result["parsed"])
+        st.write(f"Stage timings (s), trace {result['trace_id']}:")
+        st.json(result["timings"])
+
+    st.success("Task Created Successfully in Todoist")
+    show_task_summary(result["task"], result["enriched_description"])
+
 def answer_question(question: str):
     """Answer SOP question using RAG"""
-    with st.spinner("Searching SOP knowledge base..."):
-        answer = st.session_state.processor.answer_question(question)
-    
+    start_trace()
     st.subheader("Answer")
-    st.write(answer)
+    st.write_stream(st.session_state.processor.answer_question_stream(question))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
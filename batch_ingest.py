@@ -0,0 +1,45 @@
+import argparse
+import logging
+from core.config import Config
+from core.rag_engine import get_shared_engine
+from core.task_processor import TaskProcessor
+from core.todoist_client import TodoistClient
+from core.batch_processor import BatchProcessor
+
+logging.basicConfig(
+    filename=Config.LOG_FILE,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+def main():
+    parser = argparse.ArgumentParser(description="Process a JSONL backlog of task requests")
+    parser.add_argument("input", help="JSONL file; each line has message/text or title/body")
+    parser.add_argument("output", help="JSONL results file; existing lines are skipped on rerun")
+    parser.add_argument("--sop", default=None, help="Index only this SOP document instead of SOP_DIR")
+    parser.add_argument("--batch-size", type=int, default=Config.BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=Config.BATCH_MAX_WORKERS)
+    parser.add_argument("--no-todoist", action="store_true", help="Parse and enrich only, do not create tasks")
+    parser.add_argument("--retry-errors", action="store_true", help="Also rerun lines whose last result was an error")
+    args = parser.parse_args()
+
+    rag = get_shared_engine(args.sop)
+    processor = TaskProcessor(rag_engine=rag)
+    todoist_client = None if args.no_todoist else TodoistClient()
+
+    batch = BatchProcessor(
+        processor,
+        todoist_client,
+        batch_size=args.batch_size,
+        max_workers=args.workers
+    )
+    stats = batch.run(
+        args.input,
+        args.output,
+        progress=lambda s: print(f"processed {s['processed']} ({s['errors']} errors)"),
+        retry_errors=args.retry_errors
+    )
+    print(f"Done: {stats}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""Local stand-ins for Groq (OpenAI-compatible chat completions) and the
+Todoist Sync API, with latency and error injection.
+
+    python -m benchmarks.fake_servers --groq-port 8801 --todoist-port 8802 --latency-ms 400
+    export GROQ_BASE_URL=http://127.0.0.1:8801
+    export TODOIST_SYNC_URL=http://127.0.0.1:8802/sync/v9/sync
+
+Replies are deterministic given the request, so runs are comparable; the
+parse/fused JSON is keyword-derived and not meant to be accurate.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+CATEGORY_KEYWORDS = {
+    "equipment_purchase": ("laptop", "monitor", "chair", "macbook", "keyboard", "buy", "order"),
+    "software_subscription": ("subscription", "license", "renew", "saas", "seats"),
+    "travel_booking": ("flight", "hotel", "train", "travel", "trip"),
+    "meeting_scheduling": ("meeting", "schedule", "call", "review", "kickoff"),
+    "document_request": ("invoice", "receipt", "document", "copy", "contract"),
+}
+
+
+class FaultSettings:
+    def __init__(self, latency_ms: float = 200, jitter_ms: float = 50,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "errors": 0, "throttled": 0}
+
+    def latency(self) -> float:
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000.0
+
+    def fault(self) -> Optional[int]:
+        """HTTP status to fail this request with, or None"""
+        with self.lock:
+            self.counts["requests"] += 1
+            roll = self.random.random()
+            if roll < self.throttle_rate:
+                self.counts["throttled"] += 1
+                return 429
+            if roll < self.throttle_rate + self.error_rate:
+                self.counts["errors"] += 1
+                return 500
+        return None
+
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def settings(self) -> FaultSettings:
+        return self.server.settings
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _send(self, status: int, body: Dict, headers: Dict = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _inject_fault(self) -> bool:
+        status = self.settings.fault()
+        if status is None:
+            return False
+        time.sleep(self.settings.latency() / 4)
+        headers = {"Retry-After": "1"} if status == 429 else None
+        self._send(status, {"error": {"message": "injected fault", "type": "fake"}}, headers)
+        return True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _fake_task(text: str) -> Dict:
+    lowered = text.lower()
+    category = "general"
+    for name, keywords in CATEGORY_KEYWORDS.items():
+        if any(keyword in lowered for keyword in keywords):
+            category = name
+            break
+    if re.search(r"\b(urgent|asap|today|tomorrow|eod)\b", lowered):
+        priority = "high"
+    elif re.search(r"\b(no rush|when you get a chance|whenever)\b", lowered):
+        priority = "low"
+    else:
+        priority = "medium"
+    title = " ".join(text.split()[:8])
+    return {
+        "title": title,
+        "priority": priority,
+        "category": category,
+        "deadline_hint": "not specified",
+        "description": f"{title}\n- Follow the relevant SOP steps\n- Attach the invoice",
+    }
+
+
+class FakeGroqHandler(_FakeHandler):
+    def do_POST(self):
+        request = json.loads(self._read_body() or b"{}")
+        if self._inject_fault():
+            return
+
+        user = next((m["content"] for m in reversed(request.get("messages", [])) if m["role"] == "user"), "")
+        # Fused, enrichment and answer prompts lead with a "Request:"/"Task:"/"Question:" line
+        lines = user.strip().splitlines() or [""]
+        message = re.sub(r"^(Request|Task|Question):\s*", "", lines[0])
+
+        if (request.get("response_format") or {}).get("type") == "json_object":
+            content = json.dumps(_fake_task(message))
+        else:
+            content = _fake_task(message)["description"]
+        usage = {
+            "prompt_tokens": sum(len(m["content"]) // 4 for m in request.get("messages", [])),
+            "completion_tokens": len(content) // 4,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = request.get("model", "fake")
+
+        if request.get("stream"):
+            self._stream(completion_id, created, model, content, usage)
+            return
+
+        time.sleep(self.settings.latency())
+        self._send(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    def _stream(self, completion_id: str, created: int, model: str, content: str, usage: Dict):
+        # Half the latency before the first token, the rest spread over the tokens
+        latency = self.settings.latency()
+        tokens = re.findall(r"\S+\s*|\s+", content) or [""]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        time.sleep(latency / 2)
+
+        def event(delta: Dict, finish: Optional[str] = None, extra: Dict = None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+                **(extra or {}),
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        event({"role": "assistant", "content": ""})
+        for token in tokens:
+            time.sleep(latency / 2 / len(tokens))
+            event({"content": token})
+        event({}, "stop", {"x_groq": {"id": completion_id, "usage": usage}})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+class FakeTodoistHandler(_FakeHandler):
+    def do_POST(self):
+        form = parse_qs(self._read_body().decode("utf-8"))
+        if self._inject_fault():
+            return
+        time.sleep(self.settings.latency())
+
+        commands = json.loads(form.get("commands", ["[]"])[0])
+        sync_status = {}
+        temp_id_mapping = {}
+        with self.server.lock:
+            for command in commands:
+                # Replayed command uuids map to the task created the first time
+                task_id = self.server.applied.setdefault(command["uuid"], str(len(self.server.applied) + 1))
+                sync_status[command["uuid"]] = "ok"
+                temp_id_mapping[command["temp_id"]] = task_id
+        self._send(200, {"sync_status": sync_status, "temp_id_mapping": temp_id_mapping})
+
+
+class FakeServer:
+    """One fake API on a background thread"""
+
+    def __init__(self, handler_cls, port: int = 0, settings: FaultSettings = None, host: str = "127.0.0.1"):
+        self.httpd = ThreadingHTTPServer((host, port), handler_cls)
+        self.httpd.daemon_threads = True
+        self.httpd.settings = settings or FaultSettings()
+        self.httpd.lock = threading.Lock()
+        self.httpd.applied = {}
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def counts(self) -> Dict:
+        return dict(self.httpd.settings.counts)
+
+    def start(self) -> "FakeServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_fake_servers(groq_port: int = 0, todoist_port: int = 0, groq_settings: FaultSettings = None,
+                       todoist_settings: FaultSettings = None):
+    """Start both fakes; returns (groq, todoist) FakeServer instances"""
+    groq = FakeServer(FakeGroqHandler, groq_port, groq_settings).start()
+    todoist = FakeServer(FakeTodoistHandler, todoist_port, todoist_settings).start()
+    return groq, todoist
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-ms", type=float, default=300, help="Mean Groq latency")
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--todoist-latency-ms", type=float, default=80)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction answered with 429")
+    parser.add_argument("--seed", type=int, default=7)
+
+
+def settings_from_args(args):
+    groq = FaultSettings(args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate, args.seed)
+    todoist = FaultSettings(args.todoist_latency_ms, args.jitter_ms / 2, args.error_rate, args.throttle_rate, args.seed)
+    return groq, todoist
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run fake Groq and Todoist servers")
+    parser.add_argument("--groq-port", type=int, default=8801)
+    parser.add_argument("--todoist-port", type=int, default=8802)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    groq, todoist = start_fake_servers(args.groq_port, args.todoist_port, *settings_from_args(args))
+    print(f"GROQ_BASE_URL={groq.url}")
+    print(f"TODOIST_SYNC_URL={todoist.url}/sync/v9/sync")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        groq.stop()
+        todoist.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Micro-benchmarks for chunking, indexing and querying at growing corpus sizes.
+
+The corpus at size N is N copies of the SOP, each made distinct with a
+site suffix on every line so no chunks deduplicate. Query timings bypass
+the query cache.
+
+    python -m benchmarks.micro --sizes 1 4 16 64
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from core.config import Config
+from core.chunker import HEADING
+from benchmarks.report import latency_summary, write_report
+
+QUERIES = [
+    "Which card should I use for laptop purchases?",
+    "What details must an invoice include?",
+    "Can I pay with my personal card?",
+    "Where should equipment be shipped?",
+    "How do I buy a software subscription?",
+    "Who approves mobile phone purchases?",
+    "What is the billing address for invoices?",
+    "Can personal and company items be mixed in one order?",
+]
+
+
+def synthetic_corpus(base: str, copies: int) -> str:
+    parts = []
+    for site in range(1, copies + 1):
+        lines = []
+        for line in base.splitlines():
+            stripped = line.strip()
+            if not stripped:
+                lines.append(line)
+            elif HEADING.match(stripped):
+                lines.append(f"{stripped} - Site {site}")
+            else:
+                lines.append(f"{stripped} (site {site})")
+        parts.append("\n".join(lines))
+    return "\n".join(parts)
+
+
+def time_chunking(engine, content: str, repeats: int) -> Dict:
+    runs = []
+    chunks = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        chunks = engine._chunk_document(content)
+        runs.append(time.perf_counter() - started)
+    return {"chunks": len(chunks), "seconds_median": round(statistics.median(runs), 5),
+            "seconds_min": round(min(runs), 5)}
+
+
+def time_load(engine, path: str) -> Dict:
+    engine.drop_index()
+    started = time.perf_counter()
+    engine.load_sop(path)
+    seconds = time.perf_counter() - started
+    chunks = engine.collection.count()
+    return {"chunks": chunks, "seconds": round(seconds, 4),
+            "chunks_per_second": round(chunks / seconds, 1) if seconds else 0.0}
+
+
+def time_queries(search, queries: List[str], rounds: int) -> Dict:
+    latencies = []
+    for _ in range(rounds):
+        for query in queries:
+            started = time.perf_counter()
+            search(query)
+            latencies.append(time.perf_counter() - started)
+    return latency_summary(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk/index/query micro-benchmarks")
+    parser.add_argument("--sop", default=Config.SOP_PATH, help="Base document to replicate")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 4, 16, 64], help="Copies of the base document")
+    parser.add_argument("--chunk-repeats", type=int, default=5)
+    parser.add_argument("--query-rounds", type=int, default=5)
+    parser.add_argument("--output", help="Report path (default: benchmarks/reports/)")
+    args = parser.parse_args()
+
+    # In-memory index, fresh per size; embeddings are part of the load timing
+    Config.CHROMA_PERSIST_DIR = ""
+    from core.rag_engine import RAGEngine
+    from core.query_cache import QueryCache
+
+    with open(args.sop, 'r', encoding='utf-8') as f:
+        base = f.read()
+
+    engine = RAGEngine()
+    # Load the model before anything is timed
+    engine.embedding_function(["warm up"])
+    results = []
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for copies in args.sizes:
+            content = synthetic_corpus(base, copies)
+            path = os.path.join(workdir, "sop_bench.txt")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+
+            row = {"copies": copies, "chars": len(content)}
+            row["chunk_document"] = time_chunking(engine, content, args.chunk_repeats)
+            row["load_sop"] = time_load(engine, path)
+
+            engine.query_cache = QueryCache(max_entries=0, disk_path="")
+            row["query"] = time_queries(
+                lambda q: engine.query_with_scores(q, Config.RAG_TOP_K), QUERIES, args.query_rounds
+            )
+            row["hybrid_query"] = time_queries(
+                lambda q: engine.hybrid_query(q, Config.RAG_TOP_K), QUERIES, args.query_rounds
+            )
+            results.append(row)
+            print(
+                f"{copies:>4} copies: {row['load_sop']['chunks']} chunks, "
+                f"chunk {row['chunk_document']['seconds_median']}s, "
+                f"load {row['load_sop']['seconds']}s, "
+                f"query p50 {row['query']['p50']}s, hybrid p50 {row['hybrid_query']['p50']}s"
+            )
+
+    print(f"Report written to {write_report('micro', results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
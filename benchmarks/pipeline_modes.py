@@ -0,0 +1,101 @@
+"""Compare the two-call and fused task pipelines on a labelled sample.
+
+Each message goes through prepare_task + enrich_task (no Todoist calls) in
+both modes. The report gives per-task latency, Groq requests per task and
+category/priority accuracy against the labels.
+
+    python -m benchmarks.pipeline_modes --samples benchmarks/data/task_samples.jsonl
+
+Point GROQ_BASE_URL at benchmarks.fake_servers to check plumbing without
+spending quota (accuracy numbers are then meaningless).
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Dict, List
+
+from core.config import Config
+from core.rag_engine import get_shared_engine
+from core.task_processor import TaskProcessor
+from benchmarks.report import percentile, write_report
+
+MODES = ("two_call", "fused")
+
+
+def load_samples(path: str) -> List[Dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_mode(processor: TaskProcessor, mode: str, samples: List[Dict]) -> Dict:
+    processor.pipeline_mode = mode
+    requests_before = processor.llm.stats()["requests"]
+    latencies = []
+    category_hits = 0
+    priority_hits = 0
+    rows = []
+
+    for sample in samples:
+        start = time.perf_counter()
+        result = processor.prepare_task(sample["message"])
+        processor.enrich_task(result)
+        elapsed = time.perf_counter() - start
+
+        latencies.append(elapsed)
+        category_ok = result.parsed.get("category") == sample["category"]
+        priority_ok = str(result.parsed.get("priority", "")).lower() == sample["priority"]
+        category_hits += category_ok
+        priority_hits += priority_ok
+        rows.append({
+            "message": sample["message"],
+            "seconds": round(elapsed, 4),
+            "category": result.parsed.get("category"),
+            "priority": result.parsed.get("priority"),
+            "category_ok": category_ok,
+            "priority_ok": priority_ok,
+            "description_chars": len(result.enriched_description),
+        })
+
+    total = len(samples)
+    return {
+        "mode": mode,
+        "tasks": total,
+        "latency_mean": round(statistics.mean(latencies), 4),
+        "latency_p50": round(percentile(latencies, 50), 4),
+        "latency_p95": round(percentile(latencies, 95), 4),
+        "groq_requests_per_task": round((processor.llm.stats()["requests"] - requests_before) / total, 2),
+        "category_accuracy": round(category_hits / total, 3),
+        "priority_accuracy": round(priority_hits / total, 3),
+        "rows": rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark two-call vs fused task pipelines")
+    parser.add_argument("--samples", default="benchmarks/data/task_samples.jsonl")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--no-fast-parse", action="store_true",
+                        help="Send every parse to Groq so both modes are compared on model output")
+    parser.add_argument("--output", help="Report path (default: benchmarks/reports/)")
+    args = parser.parse_args()
+
+    if args.no_fast_parse:
+        Config.FAST_PARSE_ENABLED = False
+
+    samples = load_samples(args.samples)
+    processor = TaskProcessor(get_shared_engine())
+    reports = [run_mode(processor, mode, samples) for mode in args.modes]
+
+    for report in reports:
+        print(
+            f"{report['mode']:>8}: p50 {report['latency_p50']}s, p95 {report['latency_p95']}s, "
+            f"{report['groq_requests_per_task']} Groq calls/task, "
+            f"category {report['category_accuracy']:.0%}, priority {report['priority_accuracy']:.0%}"
+        )
+
+    print(f"Report written to {write_report('pipeline_modes', reports, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
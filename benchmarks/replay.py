@@ -0,0 +1,145 @@
+"""Replay a JSONL corpus of task requests through the full pipeline at a target rate.
+
+Requests are started on an open-loop schedule (request i at i / rps), so
+latency includes any queueing when the pipeline falls behind.
+
+    python -m benchmarks.replay requests.jsonl --rps 5 --limit 200 --fake --latency-ms 400
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from core.config import Config
+from core.batch_processor import BatchProcessor
+from core.metrics import FALLBACKS, run_traced
+from benchmarks.fake_servers import add_fault_arguments, settings_from_args, start_fake_servers
+from benchmarks.report import latency_summary, write_report
+
+
+def load_messages(path: str, limit: int = None) -> List[str]:
+    messages = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            messages.append(BatchProcessor.message_from_record(json.loads(line)))
+            if limit and len(messages) >= limit:
+                break
+    return messages
+
+
+def replay(processor, todoist_client, messages: List[str], rps: float, concurrency: int) -> Dict:
+    def run(message: str, scheduled: float) -> Dict:
+        try:
+            result = processor.prepare_task(message)
+            processor.enrich_task(result)
+            if todoist_client is not None:
+                processor.create_task(result, todoist_client)
+            error, timings = result.error, result.timings
+        except Exception as e:
+            # A request that raised still counts, as an error with the latency it took to fail
+            error, timings = f"{type(e).__name__}: {str(e)}", {}
+        finished = time.perf_counter()
+        return {"latency": finished - scheduled, "finished": finished, "error": error, "timings": timings}
+
+    # Injected Groq faults mostly end in a fallback (e.g. title-only description)
+    # rather than an exception, so degraded results are counted separately
+    fallbacks_before = FALLBACKS.values("reason")
+    llm_before = processor.llm.stats()
+    start = time.perf_counter()
+    futures = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i, message in enumerate(messages):
+            scheduled = start + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(run_traced, f"replay-{i}", run, message, scheduled))
+    outcomes = [future.result() for future in futures]
+    fallbacks = {
+        reason: int(count - fallbacks_before.get(reason, 0))
+        for reason, count in FALLBACKS.values("reason").items()
+        if count > fallbacks_before.get(reason, 0)
+    }
+    llm_after = processor.llm.stats()
+    groq = {
+        key: llm_after[key] - llm_before[key]
+        for key in ("failures", "throttled_429", "rejected_circuit_open", "rejected_queue_timeout")
+    }
+
+    elapsed = max(outcome["finished"] for outcome in outcomes) - start if outcomes else 0.0
+    stages = {}
+    for outcome in outcomes:
+        for stage, seconds in outcome["timings"].items():
+            stages.setdefault(stage, []).append(seconds)
+
+    return {
+        "requests": len(messages),
+        "completed": len(outcomes),
+        "errors": sum(1 for outcome in outcomes if outcome["error"]),
+        # Fallbacks taken during the run, by reason, and failed or rejected Groq calls
+        "degraded": sum(fallbacks.values()),
+        "degraded_by_reason": fallbacks,
+        "groq_faults": groq,
+        "target_rps": rps,
+        "achieved_rps": round(len(outcomes) / elapsed, 3) if elapsed else 0.0,
+        "elapsed_seconds": round(elapsed, 3),
+        "latency": latency_summary([outcome["latency"] for outcome in outcomes]),
+        "stages": {stage: latency_summary(values) for stage, values in sorted(stages.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay task requests at a target rate")
+    parser.add_argument("input", help="JSONL with message (or title/body) per line")
+    parser.add_argument("--rps", type=float, default=2.0)
+    parser.add_argument("--limit", type=int, help="Replay at most this many requests")
+    parser.add_argument("--concurrency", type=int, default=Config.MAX_CONCURRENT_REQUESTS)
+    parser.add_argument("--sop", help="Index a single SOP file instead of SOP_DIR")
+    parser.add_argument("--no-todoist", action="store_true", help="Stop after enrichment")
+    parser.add_argument("--fake", action="store_true", help="Run against in-process fake Groq/Todoist servers")
+    parser.add_argument("--groq-rpm", type=float, help="Override GROQ_REQUESTS_PER_MINUTE for the run")
+    parser.add_argument("--output", help="Report path (default: benchmarks/reports/)")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    fakes = None
+    if args.fake:
+        fakes = start_fake_servers(0, 0, *settings_from_args(args))
+        Config.GROQ_BASE_URL = fakes[0].url
+        Config.GROQ_API_KEY = Config.GROQ_API_KEY or "fake"
+        Config.TODOIST_SYNC_URL = f"{fakes[1].url}/sync/v9/sync"
+    if args.groq_rpm:
+        Config.GROQ_REQUESTS_PER_MINUTE = args.groq_rpm
+        Config.GROQ_BURST = max(Config.GROQ_BURST, args.groq_rpm / 60.0)
+
+    # Imported after the overrides above, since the Groq client reads them once
+    from core.rag_engine import get_shared_engine
+    from core.task_processor import TaskProcessor
+    from core.todoist_client import TodoistClient
+
+    processor = TaskProcessor(get_shared_engine(args.sop))
+    todoist_client = None if args.no_todoist else TodoistClient()
+    messages = load_messages(args.input, args.limit)
+
+    results = replay(processor, todoist_client, messages, args.rps, args.concurrency)
+    results["groq_client"] = processor.llm.stats()
+    if fakes:
+        results["fake_servers"] = {"groq": fakes[0].counts, "todoist": fakes[1].counts}
+        for server in fakes:
+            server.stop()
+
+    latency = results["latency"]
+    print(
+        f"{results['completed']}/{results['requests']} requests, {results['errors']} errors, "
+        f"{results['degraded']} degraded, "
+        f"{results['achieved_rps']} rps (target {args.rps}); "
+        f"p50 {latency.get('p50')}s, p99 {latency.get('p99')}s"
+    )
+    print(f"Report written to {write_report('replay', results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Shared helpers for benchmark scripts: percentiles and JSON reports.
+
+Reports carry enough context (git revision, Python version, relevant
+config) to be diffed between releases.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Dict, List
+
+from core.config import Config
+
+REPORT_DIR = "benchmarks/reports"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(values: List[float]) -> Dict:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 4),
+        "p50": round(percentile(values, 50), 4),
+        "p90": round(percentile(values, 90), 4),
+        "p99": round(percentile(values, 99), 4),
+        "max": round(max(values), 4),
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def write_report(name: str, results: Dict, path: str = None) -> str:
+    """Write results with run metadata; returns the report path"""
+    if path is None:
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        path = os.path.join(REPORT_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    report = {
+        "benchmark": name,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "config": {
+            "groq_model": Config.GROQ_MODEL,
+            "task_pipeline_mode": Config.TASK_PIPELINE_MODE,
+            "hybrid_retrieval": Config.HYBRID_RETRIEVAL,
+            "fast_parse_enabled": Config.FAST_PARSE_ENABLED,
+            "rag_top_k": Config.RAG_TOP_K,
+            "chunk_size": Config.CHUNK_SIZE,
+            "chunk_overlap": Config.CHUNK_OVERLAP,
+        },
+        "results": results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return path
@@ -0,0 +1,157 @@
+"""Compare vector store backends: startup time, resident memory and query latency.
+
+Each backend indexes the same synthetic corpus into a temporary store,
+then a fresh interpreter reopens it and is measured, so import cost and
+RSS are not shared between backends. Query timings use precomputed query
+embeddings and bypass the query cache, so they measure the store only.
+
+    python -m benchmarks.vector_backends --copies 16 --rounds 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict
+
+from core.config import Config
+from benchmarks.micro import QUERIES, synthetic_corpus
+from benchmarks.report import latency_summary, write_report
+
+BACKENDS = {
+    "chroma": {"VECTOR_BACKEND": "chroma"},
+    "numpy": {"VECTOR_BACKEND": "numpy", "NUMPY_STORE_DTYPE": "float32"},
+    "numpy-int8": {"VECTOR_BACKEND": "numpy", "NUMPY_STORE_DTYPE": "int8"},
+}
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status", 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    import resource
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def build(corpus: str) -> Dict:
+    from core.rag_engine import RAGEngine
+    engine = RAGEngine()
+    started = time.perf_counter()
+    chunks = engine.load_sop(corpus)
+    return {"chunks": chunks, "seconds": round(time.perf_counter() - started, 4)}
+
+
+def measure(rounds: int, n_results: int) -> Dict:
+    started = time.perf_counter()
+    from core.rag_engine import RAGEngine
+    from core.query_cache import QueryCache
+    import_seconds = time.perf_counter() - started
+
+    engine = RAGEngine()
+    init_seconds = time.perf_counter() - started - import_seconds
+    rss_before_open = rss_mb()
+
+    opened = time.perf_counter()
+    engine._ensure_generation()
+    open_seconds = time.perf_counter() - opened
+
+    engine.query_cache = QueryCache(max_entries=0, disk_path="")
+    embeddings = [[float(x) for x in vector] for vector in engine.embedding_function(QUERIES)]
+    collection = engine.collection
+
+    single = []
+    batched = []
+    for _ in range(rounds):
+        for query, embedding in zip(QUERIES, embeddings):
+            query_started = time.perf_counter()
+            engine.query_with_scores(query, n_results, query_embedding=embedding)
+            single.append(time.perf_counter() - query_started)
+        batch_started = time.perf_counter()
+        collection.query(query_embeddings=embeddings, n_results=n_results,
+                         include=["documents", "distances", "metadatas"])
+        batched.append(time.perf_counter() - batch_started)
+
+    return {
+        "chunks": collection.count(),
+        "chromadb_imported": "chromadb" in sys.modules,
+        "import_seconds": round(import_seconds, 4),
+        # Client setup (importing chromadb, for Chroma) plus loading the embedding model
+        "engine_init_seconds": round(init_seconds, 4),
+        "open_index_seconds": round(open_seconds, 4),
+        "startup_seconds": round(import_seconds + init_seconds + open_seconds, 4),
+        "rss_mb_before_open": rss_before_open,
+        "rss_mb_after_queries": rss_mb(),
+        "query": latency_summary(single),
+        "batch_query": latency_summary(batched),
+        "batch_size": len(QUERIES),
+    }
+
+
+def run_child(backend: str, store: str, args, step: str, corpus: str = None) -> Dict:
+    env = {
+        **os.environ,
+        **BACKENDS[backend],
+        "CHROMA_PERSIST_DIR": os.path.join(store, "chroma"),
+        "NUMPY_STORE_DIR": os.path.join(store, "vectors"),
+        "SOP_WATCH_ENABLED": "false",
+    }
+    command = [sys.executable, "-m", "benchmarks.vector_backends", "--step", step,
+               "--rounds", str(args.rounds), "--n-results", str(args.n_results)]
+    if corpus:
+        command += ["--corpus", corpus]
+    completed = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chroma vs NumPy vector store benchmark")
+    parser.add_argument("--sop", default=Config.SOP_PATH, help="Base document to replicate")
+    parser.add_argument("--copies", type=int, default=16, help="Copies of the base document in the corpus")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--n-results", type=int, default=3)
+    parser.add_argument("--output", help="Report path (default: benchmarks/reports/)")
+    # Internal: run one step in this (fresh) process and print its result as JSON
+    parser.add_argument("--step", choices=["build", "measure"], help=argparse.SUPPRESS)
+    parser.add_argument("--corpus", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.step == "build":
+        print(json.dumps(build(args.corpus)))
+        return
+    if args.step == "measure":
+        print(json.dumps(measure(args.rounds, args.n_results)))
+        return
+
+    with open(args.sop, 'r', encoding='utf-8') as f:
+        base = f.read()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = os.path.join(workdir, "sop_bench.txt")
+        with open(corpus, 'w', encoding='utf-8') as f:
+            f.write(synthetic_corpus(base, args.copies))
+
+        for backend in args.backends:
+            store = os.path.join(workdir, backend)
+            row = {"backend": backend, "copies": args.copies}
+            row["build"] = run_child(backend, store, args, "build", corpus)
+            row.update(run_child(backend, store, args, "measure"))
+            results.append(row)
+            print(
+                f"{backend:>11}: {row['chunks']} chunks, startup {row['startup_seconds']}s "
+                f"(open {row['open_index_seconds']}s), RSS {row['rss_mb_after_queries']} MB, "
+                f"query p50 {row['query']['p50']}s, batch of {row['batch_size']} p50 {row['batch_query']['p50']}s"
+            )
+
+    print(f"Report written to {write_report('vector_backends', results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from .config import Config
+
+logging.basicConfig(
+    filename=Config.LOG_FILE,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+class SemanticAnswerCache:
+    """LRU/TTL cache of answers keyed by question embedding.
+
+    A lookup is a hit when a cached question's embedding has cosine
+    similarity >= threshold with the new one. Entries are stamped with the
+    RAG index version and the whole cache is dropped when it changes.
+    """
+
+    def __init__(self, threshold: float = None, ttl_seconds: float = None, max_entries: int = None):
+        self.threshold = Config.ANSWER_CACHE_THRESHOLD if threshold is None else threshold
+        self.ttl_seconds = Config.ANSWER_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_entries = Config.ANSWER_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self._entries = OrderedDict()  # id -> (unit embedding, answer, created_at)
+        self._next_id = 0
+        self._index_version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _sync_version(self, index_version: int):
+        if index_version != self._index_version:
+            if self._entries:
+                logging.info(f"SOP index changed, dropping {len(self._entries)} cached answers")
+            self._entries.clear()
+            self._index_version = index_version
+
+    def _purge_expired(self, now: float):
+        expired = [key for key, (_, _, created) in self._entries.items() if now - created > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+
+    def lookup(self, embedding: List[float], index_version: int) -> Optional[str]:
+        """Return a cached answer for a near-duplicate question, if any"""
+        query = self._normalize(embedding)
+        with self._lock:
+            self._sync_version(index_version)
+            self._purge_expired(time.time())
+
+            if self._entries:
+                keys = list(self._entries.keys())
+                matrix = np.stack([self._entries[key][0] for key in keys])
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._entries.move_to_end(keys[best])
+                    self.hits += 1
+                    logging.info(f"Answer cache hit (similarity {scores[best]:.3f})")
+                    return self._entries[keys[best]][1]
+
+            self.misses += 1
+            return None
+
+    def store(self, embedding: List[float], answer: str, index_version: int):
+        """Cache an answer; entries from an older index version are discarded"""
+        with self._lock:
+            if self._index_version is not None and index_version < self._index_version:
+                return  # answered against an index that has since been reloaded
+            self._sync_version(index_version)
+            self._entries[self._next_id] = (self._normalize(embedding), answer, time.time())
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries)
+            }
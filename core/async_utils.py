@@ -0,0 +1,65 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import AsyncIterator, Iterator
+from .config import Config
+
+_executor = None
+_speculation_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Shared executor for blocking LLM, vector and Todoist calls"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=Config.MAX_CONCURRENT_REQUESTS,
+                    thread_name_prefix="blocking-io"
+                )
+    return _executor
+
+
+def get_speculation_executor() -> ThreadPoolExecutor:
+    """Executor for retrieval that a blocking caller overlaps with its own work.
+
+    Kept apart from get_executor(): the caller may itself be running on the
+    shared executor, and waiting there on a task queued behind it could
+    deadlock once every worker is busy.
+    """
+    global _speculation_executor
+    if _speculation_executor is None:
+        with _executor_lock:
+            if _speculation_executor is None:
+                _speculation_executor = ThreadPoolExecutor(
+                    max_workers=Config.MAX_CONCURRENT_REQUESTS,
+                    thread_name_prefix="speculative"
+                )
+    return _speculation_executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the shared executor without stalling the event loop.
+
+    The executor size caps how many blocking calls are in flight at once;
+    further calls wait in its queue. The caller's context (and so its trace
+    id) is carried into the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), partial(context.run, func, *args, **kwargs))
+
+
+async def iterate_blocking(iterator: Iterator) -> AsyncIterator:
+    """Drive a blocking iterator (e.g. a streamed completion) from async code"""
+    sentinel = object()
+    iterator = iter(iterator)
+    while True:
+        item = await run_blocking(next, iterator, sentinel)
+        if item is sentinel:
+            return
+        yield item
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Set, Tuple
+from .config import Config
+from .task_processor import TaskProcessor, TaskResult
+from .metrics import run_traced
+
+logging.basicConfig(
+    filename=Config.LOG_FILE,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+class BatchProcessor:
+    """Push a JSONL backlog through parse -> retrieve -> enrich -> Todoist.
+
+    Input lines are read lazily in windows of batch_size. Within a window
+    LLM calls run on a bounded thread pool and all retrieval queries share
+    one embedding batch and one vector search. Each input line produces one
+    output record (result or error), written in input order and flushed per
+    window, so a rerun skips every line already present in the output
+    (or, with retry_errors, every line whose latest record succeeded).
+    """
+
+    def __init__(self, processor: TaskProcessor, todoist_client=None,
+                 batch_size: int = None, max_workers: int = None):
+        self.processor = processor
+        self.todoist_client = todoist_client
+        self.batch_size = batch_size or Config.BATCH_SIZE
+        self.max_workers = max_workers or Config.BATCH_MAX_WORKERS
+
+    @staticmethod
+    def message_from_record(record: Dict) -> str:
+        """Task text from a JSONL record: message/text, or title + body"""
+        for key in ("message", "text"):
+            if record.get(key):
+                return record[key]
+        parts = [record.get("title", ""), record.get("body", "")]
+        message = "\n\n".join(part for part in parts if part)
+        if not message:
+            raise ValueError("record has no message, text, title or body")
+        return message
+
+    @staticmethod
+    def completed_lines(output_path: str, retry_errors: bool = False) -> Set[int]:
+        """Line numbers already recorded in a previous (possibly interrupted) run.
+
+        A retried line is appended again, so the last record for a line wins.
+        With retry_errors, lines whose last record is an error are not counted.
+        """
+        statuses = {}
+        if not os.path.exists(output_path):
+            return set()
+        with open(output_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    statuses[entry["line"]] = entry.get("status")
+                except (ValueError, KeyError, TypeError):
+                    continue  # torn final line from a crash
+        return {
+            line_no for line_no, status in statuses.items()
+            if not (retry_errors and status == "error")
+        }
+
+    def _windows(self, input_path: str, skip: Set[int]) -> Iterator[List[Tuple[int, str]]]:
+        window = []
+        with open(input_path, 'r', encoding='utf-8') as f:
+            for line_no, raw in enumerate(f, start=1):
+                if line_no in skip or not raw.strip():
+                    continue
+                window.append((line_no, raw))
+                if len(window) >= self.batch_size:
+                    yield window
+                    window = []
+        if window:
+            yield window
+
+    @staticmethod
+    def task_key(input_path: str, line_no: int, raw: str) -> str:
+        """Names the Todoist task of one input line across runs; an edited line is a new task"""
+        digest = hashlib.sha256(raw.strip().encode("utf-8")).hexdigest()[:16]
+        return f"{os.path.abspath(input_path)}:{line_no}:{digest}"
+
+    def _process_window(self, pool: ThreadPoolExecutor, window: List[Tuple[int, str]],
+                        input_path: str) -> List[Dict]:
+        records = {}
+        results = {}
+        invalid = {}
+
+        for line_no, raw in window:
+            try:
+                record = json.loads(raw)
+                if not isinstance(record, dict):
+                    raise ValueError("expected a JSON object")
+                records[line_no] = record
+                # Each record is its own trace, named after its request_id when it has one
+                results[line_no] = TaskResult(
+                    request=self.message_from_record(record),
+                    trace_id=str(record.get("request_id") or f"line-{line_no}")
+                )
+            except Exception as e:
+                invalid[line_no] = f"invalid record: {str(e)}"
+
+        live = list(results)
+
+        if self.processor.pipeline_mode == "fused":
+            # Stages 1-3 in one Groq call per record, concurrently
+            fused = pool.map(
+                lambda n: run_traced(results[n].trace_id, self.processor.prepare_fused, results[n].request), live
+            )
+            for line_no, result in zip(live, fused):
+                result.trace_id = results[line_no].trace_id
+                results[line_no] = result
+        else:
+            # Stage 1: parse, concurrently
+            parsed = pool.map(
+                lambda n: run_traced(results[n].trace_id, self.processor.parse_request, results[n].request), live
+            )
+            for line_no, parsed_task in zip(live, parsed):
+                results[line_no].parsed = parsed_task
+
+            # Stage 2: retrieve with one embedding batch for the window; dense-only
+            # retrieval also shares one vector search
+            rag_engine = self.processor.rag_engine
+            queries = [self.processor.task_query(results[n].parsed) for n in live]
+            if Config.HYBRID_RETRIEVAL:
+                embeddings = rag_engine.embed_queries(queries)
+                hits = [
+                    rag_engine.retrieve(query, Config.RAG_TOP_K, results[n].parsed.get('category'), embedding)
+                    for n, query, embedding in zip(live, queries, embeddings)
+                ]
+            else:
+                hits = [
+                    rag_engine.filter_relevant(batch_hits, Config.RAG_MAX_DISTANCE)
+                    for batch_hits in rag_engine.query_batch(queries, n_results=Config.RAG_TOP_K)
+                ]
+            for line_no, sop_chunks in zip(live, hits):
+                results[line_no].sop_chunks = sop_chunks
+
+            # Stage 3: enrich, concurrently
+            list(pool.map(
+                lambda n: run_traced(results[n].trace_id, self.processor.enrich_task, results[n]), live
+            ))
+
+        # Stage 4: create tasks, one Sync API batch for the window. Command ids come from
+        # the input line, so a window replayed after a crash does not create its tasks twice.
+        if self.todoist_client is not None and live:
+            clock = time.perf_counter()
+            raw_lines = dict(window)
+            created = self.todoist_client.create_tasks(
+                [(results[n].parsed, results[n].enriched_description) for n in live],
+                keys=[self.task_key(input_path, n, raw_lines[n]) for n in live]
+            )
+            for line_no, task in zip(live, created):
+                if "error" in task:
+                    results[line_no].error = task["error"]
+                else:
+                    results[line_no].task = task
+                results[line_no].mark("create", clock)
+        for line_no in live:
+            results[line_no].finish()
+
+        output = []
+        for line_no, _ in window:
+            entry = {"line": line_no, "request_id": records.get(line_no, {}).get("request_id")}
+            result = results.get(line_no)
+            if result is None:
+                entry.update(status="error", error=invalid[line_no])
+            elif result.error:
+                entry.update(status="error", error=result.error, result=result.to_dict())
+            else:
+                entry.update(status="ok", result=result.to_dict())
+            output.append(entry)
+        return output
+
+    def run(self, input_path: str, output_path: str, progress=None, retry_errors: bool = False) -> Dict:
+        """Process input_path into output_path, resuming after completed lines"""
+        skip = self.completed_lines(output_path, retry_errors)
+        if skip:
+            logging.info(f"Resuming batch run, {len(skip)} lines already completed")
+
+        stats = {"processed": 0, "errors": 0, "skipped": len(skip)}
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="batch") as pool, \
+                open(output_path, 'a', encoding='utf-8') as out:
+            for window in self._windows(input_path, skip):
+                for entry in self._process_window(pool, window, input_path):
+                    out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                    stats["processed"] += 1
+                    if entry["status"] == "error":
+                        stats["errors"] += 1
+                out.flush()
+                os.fsync(out.fileno())
+                if progress:
+                    progress(stats)
+
+        stats["seconds"] = round(time.perf_counter() - started, 3)
+        logging.info(f"Batch run finished: {stats}")
+        return stats
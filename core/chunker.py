@@ -0,0 +1,99 @@
+import os
+import re
+from typing import Dict, List, Tuple
+
+# "1. Purpose", "2.1 Employee Assets"; short numbers only, so TRNs or years are not headings
+HEADING = re.compile(r"^(\d{1,2}(?:\.\d{1,2})*)\.?\s+([A-Za-z].{0,80})$")
+
+
+def _sections(content: str) -> List[Dict]:
+    """Split the document into leaf sections, each with its heading path"""
+    sections = []
+    stack = []  # (number, heading line) of the enclosing headings
+    current = {"number": "", "title": "", "context": [], "lines": []}
+
+    for raw in content.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+
+        match = HEADING.match(line)
+        if match:
+            sections.append(current)
+            number, title = match.group(1), match.group(2).strip()
+            stack = [entry for entry in stack if number.startswith(entry[0] + ".")]
+            current = {
+                "number": number,
+                "title": title,
+                "context": [heading for _, heading in stack] + [line],
+                "lines": []
+            }
+            stack.append((number, line))
+        else:
+            current["lines"].append(line)
+
+    sections.append(current)
+    # Headings with no body of their own (e.g. "2. What Can Be Purchased")
+    # survive as context lines on their subsections
+    return [section for section in sections if section["lines"]]
+
+
+def _windows(lines: List[str], budget: int, overlap: int) -> List[List[str]]:
+    """Greedy line windows of at most `budget` chars, repeating up to `overlap` chars"""
+    windows = []
+    window, size = [], 0
+    for line in lines:
+        if window and size + len(line) + 1 > budget:
+            windows.append(window)
+            # Carry trailing lines into the next window as overlap
+            carried, carried_size = [], 0
+            for previous in reversed(window):
+                if carried_size + len(previous) + 1 > overlap:
+                    break
+                carried.append(previous)
+                carried_size += len(previous) + 1
+            window, size = carried[::-1], carried_size
+        window.append(line)
+        size += len(line) + 1
+    if window:
+        windows.append(window)
+    return windows
+
+
+def chunk_sop(content: str, chunk_size: int = 500, overlap: int = 80) -> List[Tuple[str, Dict]]:
+    """Chunk an SOP along its numbered section hierarchy.
+
+    Every chunk belongs to exactly one leaf section and starts with that
+    section's heading path, so chunks never straddle sections. Sections
+    longer than chunk_size are split on line boundaries with up to
+    `overlap` characters (at most half the body budget) repeated between
+    consecutive pieces. Runs in time linear in the document length.
+
+    Returns (text, metadata) pairs with section_number, section_title and
+    section_path metadata.
+    """
+    chunks = []
+    for section in _sections(content):
+        header = "\n".join(section["context"])
+        budget = max(chunk_size - len(header) - 1, 1)
+        # A long heading path can shrink the budget below the overlap; keep windows advancing
+        section_overlap = min(overlap, budget // 2)
+        metadata = {
+            "section_number": section["number"],
+            "section_title": section["title"],
+            "section_path": " > ".join(section["context"])
+        }
+        for window in _windows(section["lines"], budget, section_overlap):
+            body = "\n".join(window)
+            chunks.append((f"{header}\n{body}" if header else body, dict(metadata)))
+    return chunks
+
+
+def chunk_file(path: str, chunk_size: int = 500, overlap: int = 80) -> Tuple[str, List[Tuple[str, Dict]]]:
+    """Read and chunk one document; returns (source name, chunks).
+
+    Module-level so it can run in a process pool.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    return os.path.splitext(os.path.basename(path))[0], chunk_sop(content, chunk_size, overlap)
@@ -7,16 +7,140 @@ class Config:
     # ---- LLM / RAG ----
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     GROQ_MODEL = "llama-3.1-8b-instant"
+    # Override to point at a local fake server (e.g. the benchmark harness)
+    GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+    # Sized from the Groq quota; calls beyond it queue, then fail fast
+    GROQ_REQUESTS_PER_MINUTE = float(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+    GROQ_BURST = float(os.getenv("GROQ_BURST", "5"))
+    GROQ_INITIAL_CONCURRENCY = int(os.getenv("GROQ_INITIAL_CONCURRENCY", "4"))
+    GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "16"))
+    GROQ_MAX_QUEUE_SECONDS = float(os.getenv("GROQ_MAX_QUEUE_SECONDS", "10"))
+    GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "2"))
+    GROQ_BREAKER_THRESHOLD = int(os.getenv("GROQ_BREAKER_THRESHOLD", "5"))
+    GROQ_BREAKER_RESET_SECONDS = float(os.getenv("GROQ_BREAKER_RESET_SECONDS", "30"))
+
+    # Local keyword + embedding-centroid parse; Groq is used below the threshold
+    FAST_PARSE_ENABLED = os.getenv("FAST_PARSE_ENABLED", "true").lower() == "true"
+    FAST_PARSE_THRESHOLD = float(os.getenv("FAST_PARSE_THRESHOLD", "0.8"))
+    FAST_PARSE_MAX_WORDS = int(os.getenv("FAST_PARSE_MAX_WORDS", "25"))
+
+    # "two_call": parse, retrieve, then enrich. "fused": retrieve on the raw message,
+    # then one JSON completion returns the parsed fields and the enriched description.
+    TASK_PIPELINE_MODE = os.getenv("TASK_PIPELINE_MODE", "two_call")
+    # Two-call mode retrieves on the raw message while parse is in flight. Those hits are
+    # kept when the parsed title overlaps the message this much and they fit the category scope.
+    SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() == "true"
+    SPECULATIVE_MIN_OVERLAP = float(os.getenv("SPECULATIVE_MIN_OVERLAP", "0.6"))
 
     EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+    # Set to unix:/path.sock or host:port to use a shared embedding service instead of a local model
+    EMBEDDING_SERVICE_ADDRESS = os.getenv("EMBEDDING_SERVICE_ADDRESS", "")
+    EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+    EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "256"))
     CHROMA_COLLECTION = "sop_knowledge_base"
+    # Directory for the on-disk index; set to an empty string for an in-memory index
+    CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "data/chroma")
+    # "chroma", or "numpy" for the in-process store in core/vector_store.py (memory-mapped
+    # .npy embeddings under NUMPY_STORE_DIR, empty for in-memory; dtype float32 or int8)
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+    NUMPY_STORE_DIR = os.getenv("NUMPY_STORE_DIR", "data/vectors")
+    NUMPY_STORE_DTYPE = os.getenv("NUMPY_STORE_DTYPE", "float32")
+    SOP_PATH = os.getenv("SOP_PATH", "data/sop_expenses.txt")
+    # Directory walked by load_corpus; every *.txt file becomes one source
+    SOP_DIR = os.getenv("SOP_DIR", "data")
+    # Poll the indexed SOP files and hot-reload them into a new index generation on change
+    SOP_WATCH_ENABLED = os.getenv("SOP_WATCH_ENABLED", "true").lower() == "true"
+    SOP_WATCH_INTERVAL_SECONDS = float(os.getenv("SOP_WATCH_INTERVAL_SECONDS", "2"))
+    # Processes sharing an on-disk index take turns building generations (a file lock in the
+    # store directory). A replaced generation is dropped this long after its last local query,
+    # so other processes can move off it; unfinished builds are only removed past the build grace.
+    INDEX_RETIRE_GRACE_SECONDS = float(os.getenv("INDEX_RETIRE_GRACE_SECONDS", "30"))
+    INDEX_BUILD_GRACE_SECONDS = float(os.getenv("INDEX_BUILD_GRACE_SECONDS", "900"))
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+    # Section-aware chunks are small and self-contained, so fewer are needed per prompt
+    CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))
+    CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "80"))
+    RAG_TOP_K = int(os.getenv("RAG_TOP_K", "2"))
+
+    # Relevance gate on squared L2 distance (normalized MiniLM: d = 2 - 2*cos).
+    # Chunks must be within RAG_MAX_DISTANCE and within RAG_DISTANCE_MARGIN of the best hit.
+    RAG_MAX_DISTANCE = float(os.getenv("RAG_MAX_DISTANCE", "1.3"))
+    RAG_DISTANCE_MARGIN = float(os.getenv("RAG_DISTANCE_MARGIN", "0.3"))
+
+    # Prompt context: near-duplicate lines dropped, then the most query-relevant lines kept within budget
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "300"))
+    CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.95"))
+
+    # Hybrid retrieval: BM25 + dense candidates fused with reciprocal rank fusion
+    HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "8"))
+    RRF_K = 60
+    # Task category -> {source: section numbers (None for the whole document)}.
+    # Sources that are not indexed are ignored; unmapped categories search everything.
+    CATEGORY_SCOPES = {
+        "equipment_purchase": {"sop_expenses": ["2.1", "3", "4", "5", "6", "7", "8"]},
+        "software_subscription": {"sop_expenses": ["2.2", "3", "5", "6", "7", "8"]},
+        "document_request": {"sop_expenses": ["5", "7", "8", "9"]},
+        "travel_booking": {"sop_travel": None},
+    }
+
+    # Near-duplicate questions (cosine >= threshold) are answered from memory
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+    ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))
+
+    # Repeated query text reuses its embedding and top-k results
+    QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1024"))
+    # Optional SQLite file so the query cache survives restarts; empty disables it
+    QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "")
 
     # ---- Integrations ----
     TODOIST_API_KEY = os.getenv("TODOIST_API_KEY")
     TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
+    # Override the Sync API URL to point at a local fake server
+    TODOIST_SYNC_URL = os.getenv("TODOIST_SYNC_URL", "https://api.todoist.com/sync/v9/sync")
+    TODOIST_TIMEOUT_SECONDS = float(os.getenv("TODOIST_TIMEOUT_SECONDS", "10"))
+    TODOIST_MAX_CONNECTIONS = int(os.getenv("TODOIST_MAX_CONNECTIONS", "10"))
+    TODOIST_MAX_RETRIES = int(os.getenv("TODOIST_MAX_RETRIES", "4"))
+    TODOIST_BACKOFF_BASE_SECONDS = float(os.getenv("TODOIST_BACKOFF_BASE_SECONDS", "0.5"))
+    TODOIST_BACKOFF_MAX_SECONDS = float(os.getenv("TODOIST_BACKOFF_MAX_SECONDS", "8"))
+
+    # Repeated task requests from the same chat/session within the window return the
+    # task created the first time instead of calling Groq and Todoist again
+    IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+    IDEMPOTENCY_PATH = os.getenv("IDEMPOTENCY_PATH", "data/idempotency.db")
+    IDEMPOTENCY_WINDOW_SECONDS = float(os.getenv("IDEMPOTENCY_WINDOW_SECONDS", "3600"))
+    # A claim not completed within this long (e.g. the process died) no longer blocks repeats
+    IDEMPOTENCY_PENDING_TIMEOUT_SECONDS = float(os.getenv("IDEMPOTENCY_PENDING_TIMEOUT_SECONDS", "300"))
+
+    # ---- Job queue ----
+    # When enabled, the app and bot enqueue task requests and workers run them
+    JOB_QUEUE_ENABLED = os.getenv("JOB_QUEUE_ENABLED", "false").lower() == "true"
+    JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "data/jobs.db")
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    # "thread" shares the host process's engine; "process" gives each worker its own
+    JOB_WORKER_MODE = os.getenv("JOB_WORKER_MODE", "thread")
+    # Jobs still running after this long are assumed lost and handed to another worker
+    JOB_VISIBILITY_TIMEOUT_SECONDS = float(os.getenv("JOB_VISIBILITY_TIMEOUT_SECONDS", "300"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "5"))
+    JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "0.5"))
+    # How long the Streamlit app waits on a queued job before leaving it running
+    JOB_RESULT_TIMEOUT_SECONDS = float(os.getenv("JOB_RESULT_TIMEOUT_SECONDS", "120"))
+
     # ---- App ----
     LOG_FILE = "logs/app.log"
+    # Prometheus text endpoint at :METRICS_PORT/metrics; 0 disables it
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+    # Loopback only by default; set to 0.0.0.0 to let a remote Prometheus scrape it
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    # Batch ingestion: records per embedding/search batch and concurrent LLM calls
+    BATCH_SIZE = int(os.getenv("BATCH_SIZE", "32"))
+    BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "4"))
+    # Upper bound on concurrent blocking calls (Groq, Chroma, Todoist) from async handlers
+    MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "8"))
 
     @classmethod
     def validate(cls):
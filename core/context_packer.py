@@ -0,0 +1,152 @@
+import logging
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+import numpy as np
+from .config import Config
+from .chunker import HEADING
+
+logging.basicConfig(
+    filename=Config.LOG_FILE,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+def _sentences(lines: List[str]) -> List[str]:
+    """Rejoin lines wrapped mid-sentence (next line starts lowercase)"""
+    units = []
+    for line in lines:
+        if units and not units[-1].endswith(('.', ':', '!', '?')) and line[:1].islower():
+            units[-1] += " " + line
+        else:
+            units.append(line)
+    return units
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English)"""
+    return math.ceil(len(text) / 4)
+
+
+class ContextPacker:
+    """Builds the SOP context for a prompt within a token budget.
+
+    Exact repeated sentences are dropped first, which needs no embeddings;
+    most prompts fit the budget at that point and are sent as is. Only when
+    they do not are sentences embedded, near-identical ones dropped, and the
+    ones most similar to the query kept. Section headings are kept with any
+    sentence selected from their chunk, and chunk order is preserved.
+
+    The query embedding is the one retrieval already computed (RAGEngine's
+    query cache). The stored chunk embeddings cannot be reused here because
+    selection is per sentence, so sentence embeddings are computed on that
+    slow path only and cached across requests.
+    """
+
+    def __init__(self, rag_engine, token_budget: int = None, max_cached_lines: int = 4096):
+        self.rag_engine = rag_engine
+        self.token_budget = token_budget or Config.CONTEXT_TOKEN_BUDGET
+        self.max_cached_lines = max_cached_lines
+        self._line_vectors = OrderedDict()
+        self._lock = threading.Lock()
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def _embed_lines(self, lines: List[str]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            vectors = {line: self._line_vectors[line] for line in lines if line in self._line_vectors}
+        missing = [line for line in dict.fromkeys(lines) if line not in vectors]
+        if missing:
+            encoded = np.asarray(self.rag_engine.embedding_function(missing), dtype=np.float32)
+            encoded /= np.linalg.norm(encoded, axis=1, keepdims=True) + 1e-12
+            with self._lock:
+                for line, vector in zip(missing, encoded):
+                    vectors[line] = vector
+                    self._line_vectors[line] = vector
+                while len(self._line_vectors) > self.max_cached_lines:
+                    self._line_vectors.popitem(last=False)
+        return vectors
+
+    def pack(self, query_text: str, sop_chunks: List[str], token_budget: int = None) -> str:
+        """Return the packed context string for query_text"""
+        budget = token_budget or self.token_budget
+        original = "\n\n".join(sop_chunks)
+        original_tokens = estimate_tokens(original)
+
+        try:
+            # (chunk index, heading lines, body lines)
+            groups = []
+            for index, chunk in enumerate(sop_chunks):
+                lines = [line.strip() for line in chunk.splitlines() if line.strip()]
+                headings = []
+                while lines and HEADING.match(lines[0]):
+                    headings.append(lines.pop(0))
+                groups.append((index, headings, _sentences(lines)))
+
+            def render(selected) -> str:
+                blocks = []
+                for index, headings, _ in groups:
+                    lines = [line for line_index, line in selected if line_index == index]
+                    if lines:
+                        blocks.append("\n".join(headings + lines))
+                return "\n\n".join(blocks)
+
+            # Exact repeats (overlap between consecutive chunks) need no embeddings
+            seen = set()
+            body = []
+            for index, _, lines in groups:
+                for line in lines:
+                    if line not in seen:
+                        seen.add(line)
+                        body.append((index, line))
+
+            packed = render(body)
+            if estimate_tokens(packed) > budget:
+                vectors = self._embed_lines([line for _, line in body])
+
+                # Near-identical lines
+                kept, kept_vectors = [], []
+                for index, line in body:
+                    vector = vectors[line]
+                    if kept_vectors and max(float(v @ vector) for v in kept_vectors) >= Config.CONTEXT_DEDUP_THRESHOLD:
+                        continue
+                    kept.append((index, line))
+                    kept_vectors.append(vector)
+
+                query = np.asarray(self.rag_engine.embed_query(query_text), dtype=np.float32)
+                query /= np.linalg.norm(query) + 1e-12
+                ranked = sorted(
+                    range(len(kept)),
+                    key=lambda i: float(kept_vectors[i] @ query),
+                    reverse=True
+                )
+                chosen = []
+                for i in ranked:
+                    candidate = sorted(chosen + [i])
+                    if estimate_tokens(render([kept[j] for j in candidate])) > budget:
+                        continue
+                    chosen = candidate
+                packed = render([kept[j] for j in chosen])
+
+        except Exception as e:
+            logging.error(f"Context packing failed, sending chunks unpacked: {str(e)}")
+            return original
+
+        packed_tokens = estimate_tokens(packed)
+        with self._lock:
+            self.tokens_in += original_tokens
+            self.tokens_out += packed_tokens
+        logging.info(
+            f"Packed SOP context: {original_tokens} -> {packed_tokens} tokens "
+            f"({original_tokens - packed_tokens} saved)"
+        )
+        return packed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "tokens_in": self.tokens_in,
+                "tokens_out": self.tokens_out,
+                "tokens_saved": self.tokens_in - self.tokens_out
+            }
@@ -0,0 +1,209 @@
+import argparse
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Tuple
+import numpy as np
+from .config import Config
+
+logging.basicConfig(
+    filename=Config.LOG_FILE,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Wire format: every frame is a 4-byte big-endian length followed by the body.
+# Request: one JSON frame {"texts": [...]}.
+# Response: one JSON frame {"n": rows, "dim": cols} (or {"error": "..."}),
+# then one frame of rows * cols float32 values.
+
+def _send_frame(sock: socket.socket, body: bytes):
+    sock.sendall(struct.pack(">I", len(body)) + body)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("embedding service connection closed")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _recv_frame(sock: socket.socket) -> bytes:
+    (size,) = struct.unpack(">I", _recv_exact(sock, 4))
+    return _recv_exact(sock, size)
+
+
+def parse_address(address: str):
+    """'unix:/path/to.sock' or 'host:port' -> (family, address)"""
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, port = address.rsplit(":", 1)
+    return socket.AF_INET, (host, int(port))
+
+
+class MicroBatcher:
+    """Coalesces concurrent encode requests into one model call.
+
+    The first request opens a window of `window_ms`; everything that arrives
+    before it closes (or until `max_batch` texts) is encoded together.
+    """
+
+    def __init__(self, model, window_ms: float = None, max_batch: int = None):
+        self.model = model
+        self.window = (Config.EMBEDDING_BATCH_WINDOW_MS if window_ms is None else window_ms) / 1000.0
+        self.max_batch = max_batch or Config.EMBEDDING_MAX_BATCH
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.texts = 0
+        threading.Thread(target=self._run, name="embedding-batcher", daemon=True).start()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        future = Future()
+        self._queue.put((texts, future))
+        return future.result()
+
+    def _collect(self) -> List[Tuple[List[str], Future]]:
+        pending = [self._queue.get()]
+        size = len(pending[0][0])
+        deadline = time.monotonic() + self.window
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            texts = [text for request, _ in pending for text in request]
+            try:
+                vectors = np.asarray(self.model.encode(texts, convert_to_numpy=True), dtype=np.float32)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.texts += len(texts)
+            offset = 0
+            for request, future in pending:
+                future.set_result(vectors[offset:offset + len(request)])
+                offset += len(request)
+
+    def stats(self) -> Dict:
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": self.texts / self.batches if self.batches else 0.0
+        }
+
+
+class _EmbeddingHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # Connections are persistent; serve requests until the client hangs up
+        while True:
+            try:
+                request = json.loads(_recv_frame(self.request))
+            except (ConnectionError, OSError):
+                return
+            try:
+                vectors = self.server.batcher.encode(request["texts"])
+                _send_frame(self.request, json.dumps({"n": vectors.shape[0], "dim": vectors.shape[1]}).encode())
+                _send_frame(self.request, vectors.tobytes())
+            except Exception as e:
+                logging.error(f"Embedding request failed: {str(e)}")
+                _send_frame(self.request, json.dumps({"error": str(e)}).encode())
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(address: str = None):
+    """Load the model once and serve encode requests until interrupted"""
+    from sentence_transformers import SentenceTransformer
+
+    address = address or Config.EMBEDDING_SERVICE_ADDRESS
+    family, bind = parse_address(address)
+    if family == socket.AF_UNIX and os.path.exists(bind):
+        os.unlink(bind)
+
+    model = SentenceTransformer(Config.EMBEDDING_MODEL)
+    server = (_UnixServer if family == socket.AF_UNIX else _TCPServer)(bind, _EmbeddingHandler)
+    server.batcher = MicroBatcher(model)
+
+    logging.info(f"Embedding service for {Config.EMBEDDING_MODEL} listening on {address}")
+    print(f"Embedding service listening on {address}")
+    try:
+        server.serve_forever()
+    finally:
+        logging.info(f"Embedding service stopped: {server.batcher.stats()}")
+        server.server_close()
+
+
+class RemoteEmbeddingFunction:
+    """Chroma-compatible embedding function backed by the local embedding service.
+
+    Each calling thread keeps its own persistent connection.
+    """
+
+    def __init__(self, address: str = None, timeout: float = 30.0):
+        self.address = address or Config.EMBEDDING_SERVICE_ADDRESS
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        family, target = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(target)
+        return sock
+
+    def _request(self, texts: List[str]) -> np.ndarray:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = self._local.sock = self._connect()
+        _send_frame(sock, json.dumps({"texts": texts}).encode())
+        header = json.loads(_recv_frame(sock))
+        if "error" in header:
+            raise RuntimeError(f"Embedding service error: {header['error']}")
+        payload = _recv_frame(sock)
+        return np.frombuffer(payload, dtype=np.float32).reshape(header["n"], header["dim"])
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        texts = list(input)
+        try:
+            vectors = self._request(texts)
+        except (ConnectionError, OSError):
+            # Stale connection (e.g. service restarted): reconnect once
+            self._local.sock = None
+            vectors = self._request(texts)
+        return vectors.tolist()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared local embedding service")
+    parser.add_argument("--address", default=Config.EMBEDDING_SERVICE_ADDRESS or "unix:/tmp/mvp_embeddings.sock",
+                        help="unix:/path/to.sock or host:port")
+    serve(parser.parse_args().address)
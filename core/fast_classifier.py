@@ -0,0 +1,187 @@
+import logging
+import re
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from .config import Config
+
+logging.basicConfig(
+    filename=Config.LOG_FILE,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+CATEGORY_KEYWORDS = {
+    "equipment_purchase": [
+        "buy", "purchase", "order", "laptop", "macbook", "notebook", "phone", "iphone", "mobile",
+        "tablet", "ipad", "monitor", "keyboard", "mouse", "headset", "sim", "hardware", "equipment"
+    ],
+    "software_subscription": [
+        "subscription", "subscribe", "license", "licence", "software", "saas", "renew", "plan",
+        "seat", "seats", "account", "portal", "indeed", "slack", "jira", "figma", "github"
+    ],
+    "travel_booking": [
+        "flight", "flights", "hotel", "travel", "trip", "book", "booking", "visa", "airport",
+        "train", "taxi", "accommodation"
+    ],
+    "meeting_scheduling": [
+        "meeting", "schedule", "call", "sync", "calendar", "invite", "appointment", "standup",
+        "interview", "reschedule"
+    ],
+    "document_request": [
+        "invoice", "invoices", "receipt", "document", "documents", "contract", "report",
+        "statement", "certificate", "letter", "form", "copy"
+    ],
+}
+
+# Short descriptions embedded once to form a centroid per category
+CATEGORY_PROTOTYPES = {
+    "equipment_purchase": [
+        "Buy a laptop for a new employee",
+        "Order a mobile phone and SIM card",
+        "Purchase a tablet and monitor for the office",
+    ],
+    "software_subscription": [
+        "Renew the software subscription",
+        "Buy licenses for a SaaS tool",
+        "Subscribe to a recruitment portal",
+    ],
+    "travel_booking": [
+        "Book a flight and hotel for the conference",
+        "Arrange travel and accommodation for a business trip",
+    ],
+    "meeting_scheduling": [
+        "Schedule a meeting with the team",
+        "Set up a call with the client next week",
+    ],
+    "document_request": [
+        "Send me the invoice for last month",
+        "Request a copy of the contract",
+        "Upload the receipts to the drive",
+    ],
+    "general": [
+        "Follow up on the pending item",
+        "Remind me to check on this",
+    ],
+}
+
+HIGH_PRIORITY = re.compile(r"\b(urgent(ly)?|asap|immediately|critical|high priority|right away)\b", re.I)
+LOW_PRIORITY = re.compile(r"\b(low priority|no rush|whenever|not urgent|when possible)\b", re.I)
+DEADLINE = re.compile(
+    r"\b(asap|today|tonight|tomorrow|this week|next week|this month|next month"
+    r"|end of (the )?(day|week|month)|eod|eow"
+    r"|(by|before|on) (monday|tuesday|wednesday|thursday|friday|saturday|sunday|\d{1,2}(st|nd|rd|th)?( \w+)?))\b",
+    re.I
+)
+WORD = re.compile(r"[a-z]+")
+
+
+class FastTaskClassifier:
+    """In-process parse for obvious requests, so they skip the Groq round trip.
+
+    A request is classified locally only when the keyword rules and the
+    nearest MiniLM category centroid agree with enough margin; otherwise
+    classify() returns None and the caller falls back to the LLM.
+    """
+
+    def __init__(self, rag_engine, threshold: float = None):
+        self.rag_engine = rag_engine
+        self.threshold = Config.FAST_PARSE_THRESHOLD if threshold is None else threshold
+        self._categories = list(CATEGORY_PROTOTYPES)
+        self._centroids = None
+        self._lock = threading.Lock()
+        self.local = 0
+        self.fallback = 0
+
+    def _get_centroids(self) -> np.ndarray:
+        if self._centroids is None:
+            with self._lock:
+                if self._centroids is None:
+                    rows = []
+                    for category in self._categories:
+                        vectors = np.asarray(self.rag_engine.embed_queries(CATEGORY_PROTOTYPES[category]), dtype=np.float32)
+                        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                        centroid = vectors.mean(axis=0)
+                        rows.append(centroid / np.linalg.norm(centroid))
+                    self._centroids = np.stack(rows)
+        return self._centroids
+
+    @staticmethod
+    def _keyword_category(words: List[str]) -> Optional[str]:
+        counts = {
+            category: sum(word in keywords for word in words)
+            for category, keywords in CATEGORY_KEYWORDS.items()
+        }
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        if ranked[0][1] == 0 or ranked[0][1] == ranked[1][1]:
+            return None
+        return ranked[0][0]
+
+    @staticmethod
+    def _title(message: str) -> str:
+        title = HIGH_PRIORITY.sub("", LOW_PRIORITY.sub("", message))
+        title = re.sub(r"\s*[,;]\s*(?=[,;]|$)", "", title)
+        title = re.sub(r"\s+", " ", title).strip(" ,;.-!")
+        return (title[:1].upper() + title[1:])[:100]
+
+    def _confidence(self, message: str, words: List[str]):
+        keyword_category = self._keyword_category(words)
+
+        vector = np.asarray(self.rag_engine.embed_query(message), dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        scores = self._get_centroids() @ vector
+        order = np.argsort(scores)[::-1]
+        centroid_category = self._categories[order[0]]
+        margin = float(scores[order[0]] - scores[order[1]])
+
+        if keyword_category is None:
+            # Embedding evidence alone needs a clear margin over the runner-up
+            return centroid_category, min(1.0, 0.4 + 2 * margin)
+        if keyword_category != centroid_category:
+            return keyword_category, 0.4
+        return keyword_category, min(1.0, 0.75 + margin)
+
+    def classify(self, message: str) -> Optional[Dict]:
+        """Return a parsed task dict, or None when the LLM should handle it"""
+        words = WORD.findall(message.lower())
+        if not words or len(words) > Config.FAST_PARSE_MAX_WORDS:
+            self.fallback += 1
+            return None
+
+        try:
+            category, confidence = self._confidence(message, words)
+        except Exception as e:
+            logging.error(f"Fast classifier failed: {str(e)}")
+            self.fallback += 1
+            return None
+
+        if confidence < self.threshold:
+            logging.info(f"Fast parse below threshold ({confidence:.2f}), using LLM")
+            self.fallback += 1
+            return None
+
+        if HIGH_PRIORITY.search(message):
+            priority = "high"
+        elif LOW_PRIORITY.search(message):
+            priority = "low"
+        else:
+            priority = "medium"
+        deadline = DEADLINE.search(message)
+
+        self.local += 1
+        parsed = {
+            "title": self._title(message),
+            "priority": priority,
+            "category": category,
+            "deadline_hint": deadline.group(0) if deadline else "not specified"
+        }
+        logging.info(f"Fast-parsed locally ({confidence:.2f}): {parsed}")
+        return parsed
+
+    def stats(self) -> Dict:
+        total = self.local + self.fallback
+        return {
+            "local": self.local,
+            "llm": self.fallback,
+            "local_fraction": self.local / total if total else 0.0
+        }
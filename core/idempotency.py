@@ -0,0 +1,136 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Optional, Tuple
+from .config import Config
+
+logging.basicConfig(
+    filename=Config.LOG_FILE,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Outcomes of IdempotencyStore.begin
+NEW = "new"
+PENDING = "pending"
+DONE = "done"
+
+
+class IdempotencyStore:
+    """Persistent record of task requests already handled, keyed by requester and message.
+
+    begin() atomically claims a key: the first caller gets NEW and runs the
+    pipeline, repeats inside the dedup window get the stored result (DONE)
+    or PENDING while the first run is still in flight. A claim made with an
+    owner (e.g. a job id) can be taken over by the same owner, so a retried
+    job is not blocked by the pending claim of its own crashed attempt.
+    Other pending claims that are never completed lapse after the pending
+    timeout. Keys are 16-byte hash prefixes and results are zlib-compressed
+    JSON in a WITHOUT ROWID table, so entries stay small.
+    """
+
+    PURGE_EVERY = 100  # begin() calls between sweeps of expired rows
+
+    def __init__(self, path: str = None, window_seconds: float = None, pending_timeout: float = None):
+        self.path = path or Config.IDEMPOTENCY_PATH
+        self.window_seconds = Config.IDEMPOTENCY_WINDOW_SECONDS if window_seconds is None else window_seconds
+        self.pending_timeout = (
+            Config.IDEMPOTENCY_PENDING_TIMEOUT_SECONDS if pending_timeout is None else pending_timeout
+        )
+        self._lock = threading.Lock()
+        self._calls = 0
+        self.stats_counts = {"new": 0, "duplicates": 0, "pending_duplicates": 0}
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS requests (
+                key BLOB PRIMARY KEY,
+                state TEXT NOT NULL,
+                result BLOB,
+                updated_at REAL NOT NULL,
+                owner TEXT
+            ) WITHOUT ROWID"""
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(requests)")}
+        if "owner" not in columns:
+            # Files created before claims had owners
+            self._db.execute("ALTER TABLE requests ADD COLUMN owner TEXT")
+
+    @staticmethod
+    def normalize(message: str) -> str:
+        # Case, spacing and trailing punctuation differences are the same request
+        return re.sub(r"\s+", " ", message).strip().lower().rstrip(".!?")
+
+    @classmethod
+    def key_for(cls, message: str, scope: str) -> bytes:
+        digest = hashlib.sha256(f"{scope}\x00{cls.normalize(message)}".encode("utf-8"))
+        return digest.digest()[:16]
+
+    def begin(self, key: bytes, owner: Optional[str] = None) -> Tuple[str, Optional[Dict]]:
+        """Claim key; returns (NEW, None), (PENDING, None) or (DONE, result)"""
+        now = time.time()
+        with self._lock:
+            self._calls += 1
+            if self._calls % self.PURGE_EVERY == 0:
+                self._purge(now)
+
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT state, result, updated_at, owner FROM requests WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    state, result, updated_at, claimed_by = row
+                    if state == DONE and now - updated_at < self.window_seconds:
+                        self._db.execute("COMMIT")
+                        self.stats_counts["duplicates"] += 1
+                        return DONE, json.loads(zlib.decompress(result))
+                    takeover = owner is not None and claimed_by == owner
+                    if state == PENDING and now - updated_at < self.pending_timeout and not takeover:
+                        self._db.execute("COMMIT")
+                        self.stats_counts["pending_duplicates"] += 1
+                        return PENDING, None
+
+                self._db.execute(
+                    "INSERT OR REPLACE INTO requests (key, state, result, updated_at, owner) "
+                    "VALUES (?, ?, NULL, ?, ?)",
+                    (key, PENDING, now, owner)
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self.stats_counts["new"] += 1
+            return NEW, None
+
+    def complete(self, key: bytes, result: Dict):
+        blob = zlib.compress(json.dumps(result, separators=(",", ":")).encode("utf-8"))
+        with self._lock:
+            self._db.execute(
+                "UPDATE requests SET state = ?, result = ?, updated_at = ? WHERE key = ?",
+                (DONE, blob, time.time(), key)
+            )
+
+    def release(self, key: bytes):
+        """Drop a pending claim so a retry of the same request runs again"""
+        with self._lock:
+            self._db.execute("DELETE FROM requests WHERE key = ? AND state = ?", (key, PENDING))
+
+    def _purge(self, now: float):
+        self._db.execute(
+            "DELETE FROM requests WHERE (state = ? AND updated_at < ?) OR (state = ? AND updated_at < ?)",
+            (DONE, now - self.window_seconds, PENDING, now - self.pending_timeout)
+        )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM requests").fetchone()[0]
+        return {**self.stats_counts, "entries": entries}
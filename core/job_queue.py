@@ -0,0 +1,336 @@
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from .config import Config
+from .metrics import STAGE_SECONDS, current_trace_id, run_traced
+
+logging.basicConfig(
+    filename=Config.LOG_FILE,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# queued -> running -> done, or back to queued on failure until attempts run
+# out, then dead (copied to the dead_letters table)
+FINISHED_STATES = ("done", "dead")
+
+
+class JobQueue:
+    """Durable job queue on a local SQLite file.
+
+    A claimed job is leased for the visibility timeout; if its worker dies
+    the lease expires and another worker picks it up. Failed jobs are
+    retried with linear backoff until max_attempts, then dead-lettered.
+    Every process (and worker process) opens its own JobQueue on the same
+    path; claims use an immediate write transaction so a job is only ever
+    leased to one worker at a time.
+    """
+
+    def __init__(self, path: str = None, visibility_timeout: float = None, max_attempts: int = None):
+        self.path = path or Config.JOB_QUEUE_PATH
+        self.visibility_timeout = Config.JOB_VISIBILITY_TIMEOUT_SECONDS if visibility_timeout is None else visibility_timeout
+        self.max_attempts = Config.JOB_MAX_ATTEMPTS if max_attempts is None else max_attempts
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                channel TEXT,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                lease_until REAL,
+                worker TEXT,
+                result TEXT,
+                error TEXT,
+                notified INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at)")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS dead_letters (
+                job_id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                error TEXT,
+                failed_at REAL NOT NULL
+            )"""
+        )
+
+    def enqueue(self, kind: str, payload: Dict, channel: Optional[str] = None) -> int:
+        """Persist a job and return its id. `channel` names the intake that
+        collects the result with take_finished and mark_notified (None: poll with get).
+        The caller's trace id travels with the job to the worker."""
+        now = time.time()
+        payload = {**payload, "trace_id": payload.get("trace_id", current_trace_id())}
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO jobs (kind, payload, channel, status, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (kind, json.dumps(payload), channel, now, now, now)
+            )
+        logging.info(f"Enqueued {kind} job {cursor.lastrowid}")
+        return cursor.lastrowid
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        """Lease the oldest runnable job, including jobs whose lease expired"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self._db.execute(
+                        "SELECT id, kind, payload, attempts, status, created_at FROM jobs "
+                        "WHERE (status = 'queued' AND available_at <= ?) "
+                        "OR (status = 'running' AND lease_until < ?) "
+                        "ORDER BY id LIMIT 1",
+                        (now, now)
+                    ).fetchone()
+                    if row is None:
+                        self._db.execute("COMMIT")
+                        return None
+
+                    job_id, kind, payload, attempts, status, created_at = row
+                    if status == "running" and attempts >= self.max_attempts:
+                        # The worker died (or overran its lease) on the last attempt
+                        self._dead_letter(job_id, kind, payload, attempts, "visibility timeout expired", now)
+                        continue
+
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, "
+                        "worker = ?, updated_at = ? WHERE id = ?",
+                        (now + self.visibility_timeout, worker, now, job_id)
+                    )
+                    self._db.execute("COMMIT")
+                    return {
+                        "id": job_id,
+                        "kind": kind,
+                        "payload": json.loads(payload),
+                        "attempt": attempts + 1,
+                        "created_at": created_at,
+                    }
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def complete(self, job_id: int, result: Dict):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE id = ?",
+                (json.dumps(result), time.time(), job_id)
+            )
+
+    def fail(self, job_id: int, error: str):
+        """Schedule a retry, or dead-letter the job once its attempts are used up"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT kind, payload, attempts FROM jobs WHERE id = ?", (job_id,)
+                ).fetchone()
+                if row is None:
+                    self._db.execute("COMMIT")
+                    return
+                kind, payload, attempts = row
+                if attempts >= self.max_attempts:
+                    self._dead_letter(job_id, kind, payload, attempts, error, now)
+                else:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'queued', error = ?, lease_until = NULL, available_at = ?, "
+                        "updated_at = ? WHERE id = ?",
+                        (error, now + Config.JOB_RETRY_BACKOFF_SECONDS * attempts, now, job_id)
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        logging.warning(f"Job {job_id} attempt {attempts} failed: {error}")
+
+    def _dead_letter(self, job_id: int, kind: str, payload: str, attempts: int, error: str, now: float):
+        # Called inside an open transaction
+        self._db.execute(
+            "UPDATE jobs SET status = 'dead', error = ?, lease_until = NULL, updated_at = ? WHERE id = ?",
+            (error, now, job_id)
+        )
+        self._db.execute(
+            "INSERT OR REPLACE INTO dead_letters (job_id, kind, payload, attempts, error, failed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, kind, payload, attempts, error, now)
+        )
+        logging.error(f"Job {job_id} dead-lettered after {attempts} attempts: {error}")
+
+    @staticmethod
+    def _row_to_job(row) -> Dict:
+        job_id, kind, payload, status, attempts, result, error = row
+        return {
+            "id": job_id,
+            "kind": kind,
+            "payload": json.loads(payload),
+            "status": status,
+            "attempts": attempts,
+            "result": json.loads(result) if result else None,
+            "error": error,
+        }
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, kind, payload, status, attempts, result, error FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def take_finished(self, channel: str, limit: int = 50) -> List[Dict]:
+        """Finished jobs of a channel not yet delivered.
+
+        Jobs stay undelivered until mark_notified is called for each one
+        after its result was sent, so a failed send is retried on the next
+        poll. Delivery state lives in the database, so results that finish
+        while the intake process is down are handed over after it restarts.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, kind, payload, status, attempts, result, error FROM jobs "
+                "WHERE channel = ? AND notified = 0 AND status IN (?, ?) ORDER BY id LIMIT ?",
+                (channel, *FINISHED_STATES, limit)
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def mark_notified(self, job_id: int):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET notified = 1 WHERE id = ?", (job_id,))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            dead_letters = self._db.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+        return {
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "done": counts.get("done", 0),
+            "dead": counts.get("dead", 0),
+            "dead_letters": dead_letters,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# ---------------- Job handlers ----------------
+_components = None
+_components_lock = threading.Lock()
+
+
+def set_job_components(processor, todoist_client):
+    """Let thread workers reuse the host process's processor and Todoist client"""
+    global _components
+    _components = (processor, todoist_client)
+
+
+def _get_components():
+    global _components
+    if _components is None:
+        with _components_lock:
+            if _components is None:
+                # Worker processes build their own warmed engine on first job
+                from .rag_engine import get_shared_engine
+                from .task_processor import TaskProcessor
+                from .todoist_client import TodoistClient
+                engine = get_shared_engine()
+                engine.start_watching()
+                _components = (TaskProcessor(engine), TodoistClient())
+    return _components
+
+
+def handle_job(kind: str, payload: Dict) -> Dict:
+    """Run one job; raising marks the attempt failed so it is retried"""
+    if kind != "task":
+        raise ValueError(f"Unknown job kind: {kind}")
+    processor, todoist_client = _get_components()
+    # A retried job whose task was already created returns that task, and one whose
+    # earlier attempt died mid-run takes over that attempt's pending claim
+    result = processor.process_task(
+        payload["message"], todoist_client, payload.get("scope"), owner=f"job:{payload['job_id']}"
+    )
+    if result.error:
+        raise RuntimeError(result.error)
+    return result.to_dict()
+
+
+def _worker_loop(path: str, worker: str, stop_event, poll_interval: float,
+                 handler: Callable[[str, Dict], Dict]):
+    queue = JobQueue(path)
+    logging.info(f"Job worker {worker} started")
+    while not stop_event.is_set():
+        job = queue.claim(worker)
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+        if job["attempt"] == 1:
+            STAGE_SECONDS.observe(time.time() - job["created_at"], stage="job_queue_wait")
+        try:
+            payload = {**job["payload"], "job_id": job["id"]}
+            result = run_traced(payload.get("trace_id") or "-", handler, job["kind"], payload)
+        except Exception as e:
+            queue.fail(job["id"], str(e))
+            continue
+        queue.complete(job["id"], result)
+    queue.close()
+
+
+class JobWorkerPool:
+    """Threads or processes draining a JobQueue with a shared handler.
+
+    Process workers use the spawn start method, so each loads its own
+    engine instead of inheriting a forked copy of a threaded parent.
+    """
+
+    def __init__(self, path: str = None, workers: int = None, mode: str = None,
+                 handler: Callable[[str, Dict], Dict] = handle_job):
+        self.path = path or Config.JOB_QUEUE_PATH
+        self.workers = Config.JOB_WORKERS if workers is None else workers
+        self.mode = mode or Config.JOB_WORKER_MODE
+        self.handler = handler
+        self._workers = []
+        if self.mode == "process":
+            self._context = multiprocessing.get_context("spawn")
+            self._stop = self._context.Event()
+        else:
+            self._context = None
+            self._stop = threading.Event()
+
+    def start(self):
+        for n in range(self.workers):
+            name = f"{self.mode}-{os.getpid()}-{n}"
+            args = (self.path, name, self._stop, Config.JOB_POLL_INTERVAL_SECONDS, self.handler)
+            if self._context is not None:
+                worker = self._context.Process(target=_worker_loop, args=args, name=name, daemon=True)
+            else:
+                worker = threading.Thread(target=_worker_loop, args=args, name=name, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        logging.info(f"Started {self.workers} {self.mode} job workers on {self.path}")
+
+    def stop(self, timeout: float = 10):
+        """Stop claiming new jobs and wait for in-flight ones; unfinished
+        jobs are picked up again after their lease expires"""
+        self._stop.set()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
@@ -0,0 +1,281 @@
+import logging
+import random
+import threading
+import time
+from typing import Dict, Iterator
+import groq
+from groq import Groq
+from .config import Config
+from .metrics import RETRIES, STAGE_SECONDS, record_groq_usage, stage_timer
+
+logging.basicConfig(
+    filename=Config.LOG_FILE,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+class LLMUnavailableError(RuntimeError):
+    """Raised instead of calling Groq when the call would not be admitted"""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    pass
+
+
+class QueueTimeoutError(LLMUnavailableError):
+    pass
+
+
+class TokenBucket:
+    """Request-rate limiter: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: float) -> bool:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def refund(self):
+        """Return a token taken for a request that was never sent"""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+
+class AIMDLimiter:
+    """Concurrency limit that grows by ~1 per window of successes and halves on 429"""
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1):
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.minimum = minimum
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, deadline: float) -> bool:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, success: bool, throttled: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+            elif success:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures, probes again after `reset_seconds`"""
+
+    def __init__(self, threshold: int, reset_seconds: float):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half_open" and self._probing):
+                raise CircuitOpenError("Groq circuit breaker is open")
+            if state == "half_open":
+                self._probing = True  # let a single probe through
+
+    def release_probe(self):
+        """Let the next call probe again; outcomes that say nothing about Groq's health end here"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.threshold:
+                if self.opened_at is None or self.state == "half_open":
+                    logging.warning(f"Groq circuit breaker opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+
+
+# Errors that indicate Groq (not our request) is unhealthy
+TRANSIENT_ERRORS = (
+    groq.RateLimitError,
+    groq.InternalServerError,
+    groq.APIConnectionError,
+)
+
+
+class LLMClient:
+    """Shared Groq wrapper: token-bucket rate limit, AIMD concurrency, circuit breaker.
+
+    Callers pass the usual chat.completions.create kwargs to complete() or
+    stream(). Calls that cannot be admitted within GROQ_MAX_QUEUE_SECONDS,
+    or that arrive while the breaker is open, raise LLMUnavailableError
+    without reaching Groq.
+    """
+
+    def __init__(self, groq_client: Groq = None):
+        # Retries are handled here so 429s feed the limiter instead of hiding in the SDK
+        self.groq_client = groq_client or Groq(
+            api_key=Config.GROQ_API_KEY, base_url=Config.GROQ_BASE_URL, max_retries=0
+        )
+        self.bucket = TokenBucket(Config.GROQ_REQUESTS_PER_MINUTE / 60.0, Config.GROQ_BURST)
+        self.limiter = AIMDLimiter(Config.GROQ_INITIAL_CONCURRENCY, Config.GROQ_MAX_CONCURRENCY)
+        self.breaker = CircuitBreaker(Config.GROQ_BREAKER_THRESHOLD, Config.GROQ_BREAKER_RESET_SECONDS)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "rejected_circuit_open": 0,
+            "rejected_queue_timeout": 0,
+            "throttled_429": 0,
+            "failures": 0,
+            "queue_delay_total": 0.0,
+            "queue_delay_max": 0.0,
+        }
+
+    def _count(self, key: str, value: float = 1):
+        with self._stats_lock:
+            self._stats[key] += value
+
+    def _admit(self):
+        """Wait for a rate token and a concurrency slot; returns the queueing delay"""
+        try:
+            self.breaker.allow()
+        except CircuitOpenError:
+            self._count("rejected_circuit_open")
+            raise
+
+        started = time.monotonic()
+        deadline = started + Config.GROQ_MAX_QUEUE_SECONDS
+        if not self.bucket.acquire(deadline):
+            self._count("rejected_queue_timeout")
+            self.breaker.release_probe()
+            raise QueueTimeoutError("Groq rate limit queue timeout")
+        if not self.limiter.acquire(deadline):
+            self._count("rejected_queue_timeout")
+            self.bucket.refund()
+            self.breaker.release_probe()
+            raise QueueTimeoutError("Groq concurrency queue timeout")
+
+        delay = time.monotonic() - started
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            self._stats["queue_delay_total"] += delay
+            self._stats["queue_delay_max"] = max(self._stats["queue_delay_max"], delay)
+        return delay
+
+    def _record(self, error: Exception = None):
+        """Release the slot and feed the outcome to the limiter and breaker"""
+        throttled = isinstance(error, groq.RateLimitError)
+        try:
+            self.limiter.release(success=error is None, throttled=throttled)
+            if error is None:
+                self.breaker.record_success()
+            elif isinstance(error, TRANSIENT_ERRORS):
+                if throttled:
+                    self._count("throttled_429")
+                self._count("failures")
+                self.breaker.record_failure()
+        finally:
+            # Non-transient errors (e.g. 400/401) neither close nor reopen the breaker
+            self.breaker.release_probe()
+
+    def _backoff(self, attempt: int):
+        time.sleep(random.uniform(0, min(8.0, 0.5 * (2 ** attempt))))
+
+    def complete(self, **kwargs):
+        """Blocking chat completion through the limiter"""
+        for attempt in range(Config.GROQ_MAX_RETRIES + 1):
+            self._admit()
+            try:
+                with stage_timer("groq"):
+                    response = self.groq_client.chat.completions.create(**kwargs)
+            except Exception as e:
+                self._record(e)
+                if isinstance(e, groq.RateLimitError) and attempt < Config.GROQ_MAX_RETRIES:
+                    RETRIES.inc(service="groq")
+                    self._backoff(attempt)
+                    continue
+                raise
+            self._record()
+            record_groq_usage(getattr(response, "usage", None))
+            return response
+
+    def stream(self, **kwargs) -> Iterator:
+        """Streamed chat completion; the concurrency slot is held until the stream ends"""
+        self._admit()
+        error = None
+        started = time.perf_counter()
+        try:
+            for chunk in self.groq_client.chat.completions.create(stream=True, **kwargs):
+                # Groq reports usage on the final chunk
+                x_groq = getattr(chunk, "x_groq", None)
+                record_groq_usage(getattr(x_groq, "usage", None))
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._record(error)
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="groq_stream")
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        admitted = stats["requests"]
+        stats["queue_delay_avg"] = stats["queue_delay_total"] / admitted if admitted else 0.0
+        stats["concurrency_limit"] = int(self.limiter.limit)
+        stats["in_flight"] = self.limiter.in_flight
+        stats["circuit_state"] = self.breaker.state
+        return stats
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Process-wide LLMClient so every TaskProcessor shares one quota"""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_lock:
+            if _shared_client is None:
+                _shared_client = LLMClient()
+    return _shared_client
@@ -0,0 +1,249 @@
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+from .config import Config
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - [%(trace_id)s] %(message)s'
+
+logging.basicConfig(
+    filename=Config.LOG_FILE,
+    level=logging.INFO,
+    format=LOG_FORMAT
+)
+
+
+# ---------------- Trace ids ----------------
+_trace_id = contextvars.ContextVar("trace_id", default="-")
+
+
+def start_trace(trace_id: Optional[str] = None) -> str:
+    """Start (or resume) a trace in the current context and return its id.
+
+    The id follows the request through asyncio tasks, run_blocking calls
+    and queued jobs, and is stamped on every log record.
+    """
+    trace_id = trace_id or uuid.uuid4().hex[:12]
+    _trace_id.set(trace_id)
+    return trace_id
+
+
+def current_trace_id() -> str:
+    return _trace_id.get()
+
+
+def run_traced(trace_id: str, func, *args, **kwargs):
+    """Call func under trace_id, e.g. inside a plain thread pool worker"""
+    context = contextvars.copy_context()
+    context.run(_trace_id.set, trace_id)
+    return context.run(func, *args, **kwargs)
+
+
+class TraceIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = _trace_id.get()
+        return True
+
+
+def install_trace_logging():
+    """Stamp trace ids on records handled by the root handlers.
+
+    Whichever module's basicConfig ran first created the handlers, so the
+    filter and trace-aware format are applied to them here.
+    """
+    for handler in logging.getLogger().handlers:
+        if not any(isinstance(f, TraceIdFilter) for f in handler.filters):
+            handler.addFilter(TraceIdFilter())
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+
+install_trace_logging()
+
+
+# ---------------- Metric types ----------------
+def _label_key(labels: Dict[str, str]) -> Tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: Tuple, extra: Tuple = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def values(self, label: str) -> Dict[str, float]:
+        """Current totals keyed by the value of one label"""
+        totals = {}
+        with self._lock:
+            for key, value in self._values.items():
+                name = dict(key).get(label, "")
+                totals[name] = totals.get(name, 0.0) + value
+        return totals
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return "\n".join(lines)
+
+
+class Histogram:
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = None):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets or self.DEFAULT_BUCKETS)
+        self._series = {}  # label key -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0, 0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, (('le', bound),))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series[-2]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-1]}")
+        return "\n".join(lines)
+
+
+class MetricsRegistry:
+    """Process-wide metrics plus collectors that read existing stats() dicts at scrape time"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = None) -> Histogram:
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, help_text, buckets))
+
+    def register_collector(self, name: str, collect: Callable[[], Dict]):
+        """Expose numeric values of collect() as mvp_<name>_<key> gauges.
+
+        Registering a name again replaces the previous collector.
+        """
+        with self._lock:
+            self._collectors[name] = collect
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+
+        blocks = [metric.render() for metric in metrics]
+        for name, collect in collectors:
+            try:
+                values = collect()
+            except Exception as e:
+                logging.warning(f"Metrics collector {name} failed: {str(e)}")
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    blocks.append(f"# TYPE mvp_{name}_{key} gauge\nmvp_{name}_{key} {value}")
+        return "\n".join(blocks) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram("mvp_stage_seconds", "Time spent per pipeline stage")
+GROQ_TOKENS = REGISTRY.counter("mvp_groq_tokens_total", "Groq tokens used, by kind (prompt or completion)")
+FALLBACKS = REGISTRY.counter("mvp_fallbacks_total", "Degraded results returned instead of an error, by reason")
+RETRIES = REGISTRY.counter("mvp_retries_total", "Retried calls to external services, by service")
+
+
+@contextmanager
+def stage_timer(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+def record_groq_usage(usage):
+    """Count prompt/completion tokens from a Groq usage object (absent on some responses)"""
+    if usage is None:
+        return
+    GROQ_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, kind="prompt")
+    GROQ_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, kind="completion")
+
+
+# ---------------- Exposition ----------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = None) -> Optional[ThreadingHTTPServer]:
+    """Serve Prometheus text on METRICS_HOST:port/metrics from a daemon thread (once per process).
+
+    Port 0 disables the endpoint. A port already in use is logged and skipped,
+    so a second process on the same host keeps running without it.
+    """
+    global _server
+    port = Config.METRICS_PORT if port is None else port
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((Config.METRICS_HOST, port), _MetricsHandler)
+            except OSError as e:
+                logging.warning(f"Metrics endpoint not started on port {port}: {str(e)}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+            logging.info(f"Metrics endpoint on {Config.METRICS_HOST}:{port}/metrics")
+    return _server
@@ -0,0 +1,147 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from .config import Config
+
+logging.basicConfig(
+    filename=Config.LOG_FILE,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+class QueryCache:
+    """Bounded LRU of normalized query text -> embedding and top-k results.
+
+    Embeddings only depend on the model, so they survive index reloads.
+    Results are stamped with the index fingerprint and ignored once the
+    indexed content changes. With a disk path set, entries are written
+    through to SQLite and read back on a memory miss, so they survive
+    restarts.
+    """
+
+    def __init__(self, max_entries: int = None, disk_path: str = None, model_name: str = None):
+        self.max_entries = Config.QUERY_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.model_name = model_name or Config.EMBEDDING_MODEL
+        self._entries = OrderedDict()  # key -> {"embedding", "fingerprint", "results"}
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+
+        disk_path = Config.QUERY_CACHE_PATH if disk_path is None else disk_path
+        if disk_path:
+            os.makedirs(os.path.dirname(disk_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS query_cache (
+                    key TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    embedding TEXT NOT NULL,
+                    fingerprint TEXT,
+                    results TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (key, model)
+                )"""
+            )
+            self._db.commit()
+
+    @staticmethod
+    def normalize(query_text: str) -> str:
+        # The MiniLM tokenizer is uncased and ignores extra whitespace, so
+        # these variants embed identically.
+        return re.sub(r"\s+", " ", query_text).strip().lower()
+
+    def _load(self, key: str) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        if self._db is None:
+            return None
+
+        row = self._db.execute(
+            "SELECT embedding, fingerprint, results FROM query_cache WHERE key = ? AND model = ?",
+            (key, self.model_name)
+        ).fetchone()
+        if row is None:
+            return None
+
+        entry = {
+            "embedding": json.loads(row[0]),
+            "fingerprint": row[1],
+            "results": {int(n): hits for n, hits in json.loads(row[2] or "{}").items()}
+        }
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry: Dict):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _persist(self, key: str, entry: Dict):
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO query_cache VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                self.model_name,
+                json.dumps(entry["embedding"]),
+                entry["fingerprint"],
+                json.dumps(entry["results"]),
+                time.time()
+            )
+        )
+        self._db.commit()
+
+    def get_embedding(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._load(key)
+            return entry["embedding"] if entry else None
+
+    def put_embedding(self, key: str, embedding: List[float]):
+        with self._lock:
+            entry = self._load(key)
+            if entry is None:
+                entry = {"embedding": embedding, "fingerprint": None, "results": {}}
+                self._remember(key, entry)
+                self._persist(key, entry)
+
+    def get_results(self, key: str, n_results: int, fingerprint: Optional[str]) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._load(key)
+            if fingerprint and entry and entry["fingerprint"] == fingerprint and n_results in entry["results"]:
+                self.hits += 1
+                return entry["results"][n_results]
+            self.misses += 1
+            return None
+
+    def put_results(self, key: str, n_results: int, fingerprint: Optional[str],
+                    embedding: List[float], results: List[Dict]):
+        if not fingerprint:
+            return
+        with self._lock:
+            entry = self._load(key)
+            if entry is None or entry["fingerprint"] != fingerprint:
+                entry = {"embedding": embedding, "fingerprint": fingerprint, "results": {}}
+                self._remember(key, entry)
+            entry["results"][n_results] = results
+            self._persist(key, entry)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries)
+            }
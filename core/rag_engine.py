@@ -1,9 +1,29 @@
-import chromadb
-from chromadb.utils import embedding_functions
-from sentence_transformers import SentenceTransformer
+import fnmatch
+import hashlib
 import logging
-from typing import List, Dict
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import numpy as np
+from typing import List, Dict, Optional
 from .config import Config
+from .async_utils import run_blocking
+from .query_cache import QueryCache
+from .embedding_service import RemoteEmbeddingFunction
+from .chunker import chunk_file, chunk_sop
+from .bm25 import BM25Index
+from .metrics import REGISTRY, stage_timer
+from .sop_watcher import SopWatcher
+from .vector_store import LocalEmbeddingFunction, NumpyVectorClient
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are only serialized within one process
+    fcntl = None
 
 logging.basicConfig(
     filename=Config.LOG_FILE,
@@ -11,34 +31,135 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+
+@contextmanager
+def _store_lock(store_dir: str):
+    """Exclusive file lock shared by every process using the on-disk index in store_dir"""
+    if not store_dir or fcntl is None:
+        yield
+        return
+    os.makedirs(store_dir, exist_ok=True)
+    with open(os.path.join(store_dir, "index.lock"), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class IndexGeneration:
+    """One immutable build of the index: a vector store collection plus its BM25 index.
+
+    Readers pin the generation they started on, so a reload can swap in a
+    new one mid-query. A retired generation refuses new readers and is
+    dropped once the ones it has are done.
+    """
+
+    def __init__(self, number: int, collection, bm25: BM25Index, fingerprint: str):
+        self.number = number
+        self.collection = collection
+        self.bm25 = bm25
+        self.fingerprint = fingerprint
+        self.readers = 0
+        self.retired = False
+        self._cond = threading.Condition()
+
+    @property
+    def name(self) -> str:
+        return self.collection.name
+
+    def acquire(self) -> bool:
+        with self._cond:
+            if self.retired:
+                return False
+            self.readers += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.readers -= 1
+            if self.readers == 0:
+                self._cond.notify_all()
+
+    def retire(self):
+        """Refuse new readers and block until the current ones are done"""
+        with self._cond:
+            self.retired = True
+            while self.readers:
+                self._cond.wait()
+
+
 class RAGEngine:
     def __init__(self):
-        self.client = chromadb.Client()
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=Config.EMBEDDING_MODEL
-        )
-        self.collection = None
-        
+        self.backend = Config.VECTOR_BACKEND
+        if self.backend == "numpy":
+            self.client = NumpyVectorClient(Config.NUMPY_STORE_DIR)
+            self.store_dir = Config.NUMPY_STORE_DIR
+        else:
+            # Imported here so the NumPy backend never pays for chromadb
+            import chromadb
+            if Config.CHROMA_PERSIST_DIR:
+                # Processes opening a new store at once would race on its schema migrations
+                with _store_lock(Config.CHROMA_PERSIST_DIR):
+                    self.client = chromadb.PersistentClient(path=Config.CHROMA_PERSIST_DIR)
+            else:
+                self.client = chromadb.Client()
+            self.store_dir = Config.CHROMA_PERSIST_DIR
+        if Config.EMBEDDING_SERVICE_ADDRESS:
+            # The model lives in the shared service; this process never loads it
+            self.embedding_function = RemoteEmbeddingFunction(Config.EMBEDDING_SERVICE_ADDRESS)
+        elif self.backend == "numpy":
+            self.embedding_function = LocalEmbeddingFunction(Config.EMBEDDING_MODEL)
+        else:
+            from chromadb.utils import embedding_functions
+            self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
+                model_name=Config.EMBEDDING_MODEL
+            )
+        # Current index generation; replaced wholesale on every content change
+        self._generation = None
+        # Bumped whenever the indexed content changes; caches compare against it
+        self.index_version = 0
+        self.query_cache = QueryCache()
+        # Serializes index writes in this process (_build_lock adds the cross-process file
+        # lock); queries read the current generation without taking it
+        self._lock = threading.RLock()
+        self.ready = False
+        # What load_sop/load_corpus indexed last, so a watcher can reload it
+        self.watch_path = None
+        self.watch_pattern = "*.txt"
+        self._corpus_root = None
+        self.watcher = None
+        self.last_reload = None
+    
+    @property
+    def collection(self):
+        generation = self._generation
+        return generation.collection if generation is not None else None
+    
+    @property
+    def bm25(self) -> Optional[BM25Index]:
+        # Sparse index over the same chunks as the collection
+        generation = self._generation
+        return generation.bm25 if generation is not None else None
+    
+    @property
+    def index_fingerprint(self) -> Optional[str]:
+        # Hash of all indexed chunk ids; stable across restarts for the disk cache tier
+        generation = self._generation
+        return generation.fingerprint if generation is not None else None
+    
     def load_sop(self, filepath: str):
         """Load SOP document into vector database"""
+        with self._lock:
+            return self._load_sop(filepath)
+    
+    def _load_sop(self, filepath: str):
         try:
             logging.info(f"Loading SOP from {filepath}")
             
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            chunks = self._chunk_document(content)
-            
-            self.collection = self.client.get_or_create_collection(
-                name=Config.CHROMA_COLLECTION,
-                embedding_function=self.embedding_function
-            )
-            
-            self.collection.add(
-                documents=chunks,
-                ids=[f"chunk_{i}" for i in range(len(chunks))],
-                metadatas=[{"source": "sop_expenses", "chunk_index": i} for i in range(len(chunks))]
-            )
+            source, chunks = chunk_file(filepath, Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)
+            self._index_sources({source: chunks})
+            self.watch_path, self._corpus_root = filepath, None
             
             logging.info(f"Loaded {len(chunks)} chunks into vector database")
             return len(chunks)
@@ -47,46 +168,701 @@ class RAGEngine:
             logging.error(f"Error loading SOP: {str(e)}")
             raise
     
-    def _chunk_document(self, content: str, chunk_size: int = 500) -> List[str]:
-        """Split document into chunks by sections"""
-        sections = content.split('\n\n')
-        chunks = []
-        current_chunk = ""
+    def load_corpus(self, directory: str = None, pattern: str = "*.txt",
+                    workers: int = None, progress=None) -> Dict:
+        """Index every matching document under a directory.
+
+        Files are read and chunked in a process pool, new chunks are
+        embedded in EMBED_BATCH_SIZE batches and bulk-inserted with the file
+        stem as their source. Sources whose files are gone are removed.
+        progress, if given, is called with a stats dict as work completes.
+        """
+        directory = directory or Config.SOP_DIR
+        with self._lock:
+            try:
+                started = time.perf_counter()
+                paths = self._corpus_paths(directory, pattern)
+                logging.info(f"Loading corpus of {len(paths)} documents from {directory}")
+                
+                stats = {"files_total": len(paths), "files_done": 0,
+                         "chunks_total": 0, "chunks_embedded": 0}
+                sources = {}
+                workers = workers or Config.INGEST_WORKERS
+                
+                if len(paths) > 1 and workers > 1:
+                    with ProcessPoolExecutor(max_workers=workers) as pool:
+                        chunked = pool.map(
+                            chunk_file, paths,
+                            [Config.CHUNK_SIZE] * len(paths), [Config.CHUNK_OVERLAP] * len(paths)
+                        )
+                        for path, (_, chunks) in zip(paths, chunked):
+                            sources[self._source_name(directory, path)] = chunks
+                            stats["files_done"] += 1
+                            stats["chunks_total"] += len(chunks)
+                            if progress:
+                                progress(dict(stats))
+                else:
+                    for path in paths:
+                        _, chunks = chunk_file(path, Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)
+                        sources[self._source_name(directory, path)] = chunks
+                        stats["files_done"] += 1
+                        stats["chunks_total"] += len(chunks)
+                        if progress:
+                            progress(dict(stats))
+                
+                def on_embedded(count):
+                    stats["chunks_embedded"] += count
+                    if progress:
+                        progress(dict(stats))
+                
+                self._index_sources(sources, prune_missing=True, on_embedded=on_embedded)
+                self.watch_path, self.watch_pattern, self._corpus_root = directory, pattern, directory
+                
+                stats["seconds"] = round(time.perf_counter() - started, 3)
+                stats["chunks_per_second"] = round(stats["chunks_total"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+                logging.info(f"Corpus loaded: {stats}")
+                return stats
+                
+            except Exception as e:
+                logging.error(f"Error loading corpus: {str(e)}")
+                raise
+    
+    @staticmethod
+    def _source_name(directory: str, path: str) -> str:
+        """Path relative to the corpus root without extension, e.g. 'hr/sop_leave'"""
+        return os.path.splitext(os.path.relpath(path, directory))[0].replace(os.sep, "/")
+    
+    def _corpus_paths(self, directory: str, pattern: str) -> List[str]:
+        skip = os.path.abspath(self.store_dir) if self.store_dir else None
+        paths = []
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(root, d)) != skip)
+            paths.extend(os.path.join(root, name) for name in sorted(files) if fnmatch.fnmatch(name, pattern))
+        return paths
+    
+    def reload_paths(self, changed: List[str], removed: List[str] = ()) -> bool:
+        """Re-chunk changed files and drop removed ones in a new index generation.
+
+        Paths belong to what load_sop/load_corpus indexed last (the SOP
+        watcher passes them in). Returns True if a new generation was
+        swapped in, False if the content turned out unchanged.
+        """
+        with self._lock:
+            try:
+                sources = {}
+                for path in changed:
+                    _, chunks = chunk_file(path, Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)
+                    sources[self._source_for(path)] = chunks
+                swapped = self._index_sources(sources, removed={self._source_for(path) for path in removed})
+                if swapped:
+                    self.last_reload = time.time()
+                return swapped
+                
+            except Exception as e:
+                logging.error(f"Error reloading SOPs: {str(e)}")
+                raise
+    
+    def _source_for(self, path: str) -> str:
+        if self._corpus_root:
+            return self._source_name(self._corpus_root, path)
+        return os.path.splitext(os.path.basename(path))[0]
+    
+    def start_watching(self, interval: float = None):
+        """Reload whatever load_sop/load_corpus indexed whenever its files change.
+
+        No-op when SOP_WATCH_ENABLED is off; safe to call more than once.
+        """
+        if not Config.SOP_WATCH_ENABLED:
+            return None
+        with self._lock:
+            if self.watcher is None and self.watch_path:
+                self.watcher = SopWatcher(self, self.watch_path, self.watch_pattern, interval)
+                self.watcher.start()
+                REGISTRY.register_collector("sop_watch", self.watcher.stats)
+        return self.watcher
+    
+    def _index_sources(self, sources: Dict[str, List], prune_missing: bool = False, on_embedded=None,
+                       removed=()) -> bool:
+        """Build the next index generation from freshly chunked sources and swap it in.
+
+        Chunks are keyed by content hash, so unchanged chunks carry their
+        stored embeddings over and only new or edited text is sent to the
+        model. Other sources already indexed are kept unless prune_missing
+        is set or they are listed in removed. The new generation is built
+        off to the side while queries keep using the current one. Builds
+        from processes sharing the store take turns and start from the
+        newest finished generation, so a change another process already
+        built is adopted rather than rebuilt. Returns False when the
+        current generation is unchanged.
+        """
+        with self._build_lock():
+            return self._build_generation(sources, prune_missing, on_embedded, removed)
+    
+    def _build_generation(self, sources: Dict[str, List], prune_missing: bool, on_embedded, removed) -> bool:
+        # Called with the build lock held
+        rows = {}
+        for source, chunks in sources.items():
+            for i, (chunk, section) in enumerate(chunks):
+                chunk_id = self._chunk_id(source, chunk)
+                if chunk_id not in rows:
+                    rows[chunk_id] = (chunk, {"source": source, "chunk_index": i, "content_hash": chunk_id, **section})
+        
+        # Another process may have built a newer generation; build on top of it
+        previous = self._generation
+        current = self._adopt_latest()
+        stored = {}  # chunk id -> (document, metadata, embedding) in the current generation
+        if current is not None:
+            indexed = current.collection.get(include=["embeddings", "documents", "metadatas"])
+            for chunk_id, document, metadata, embedding in zip(
+                    indexed['ids'], indexed['documents'], indexed['metadatas'], indexed['embeddings']):
+                stored[chunk_id] = (document, metadata or {}, embedding)
+        
+        for chunk_id, (document, metadata, _) in stored.items():
+            source = metadata.get("source")
+            if not prune_missing and source not in sources and source not in removed:
+                rows.setdefault(chunk_id, (document, metadata))
+        
+        new_ids = [chunk_id for chunk_id in rows if chunk_id not in stored]
+        kept_ids = [chunk_id for chunk_id in rows if chunk_id in stored]
+        stale_count = len(stored) - len(kept_ids)
+        if current is not None and not new_ids and not stale_count and all(
+                stored[chunk_id][1] == rows[chunk_id][1] for chunk_id in kept_ids):
+            logging.info(f"Index generation {current.number} is up to date")
+            return current is not previous
+        
+        self._drop_abandoned_builds()
+        
+        number = current.number + 1 if current is not None else 1
+        collection = self.client.create_collection(
+            name=f"{Config.CHROMA_COLLECTION}_g{number}_{uuid.uuid4().hex[:8]}",
+            embedding_function=self.embedding_function,
+            metadata={"started_at": time.time()}
+        )
+        try:
+            batch_size = Config.EMBED_BATCH_SIZE
+            for start in range(0, len(kept_ids), batch_size):
+                batch = kept_ids[start:start + batch_size]
+                collection.add(
+                    ids=batch,
+                    documents=[rows[chunk_id][0] for chunk_id in batch],
+                    metadatas=[rows[chunk_id][1] for chunk_id in batch],
+                    embeddings=[stored[chunk_id][2] for chunk_id in batch]
+                )
+            for start in range(0, len(new_ids), batch_size):
+                batch = new_ids[start:start + batch_size]
+                documents = [rows[chunk_id][0] for chunk_id in batch]
+                collection.add(
+                    ids=batch,
+                    documents=documents,
+                    metadatas=[rows[chunk_id][1] for chunk_id in batch],
+                    embeddings=[[float(x) for x in vector] for vector in self.embedding_function(documents)]
+                )
+                if on_embedded:
+                    on_embedded(len(batch))
+            # Marks the build complete; unmarked collections are leftovers of interrupted builds
+            collection.modify(metadata={"built_at": time.time()})
+        except Exception:
+            self.client.delete_collection(collection.name)
+            raise
+        
+        ids = list(rows)
+        bm25 = BM25Index(ids, [rows[chunk_id][0] for chunk_id in ids], [rows[chunk_id][1] for chunk_id in ids])
+        # The swap is a single reference assignment: queries already running
+        # finish on the generation they pinned, new ones start on this one
+        self._generation = IndexGeneration(number, collection, bm25, self._fingerprint(ids))
+        self.index_version += 1
+        if current is not None:
+            threading.Thread(target=self._retire, args=(current,), name=f"retire-g{current.number}", daemon=True).start()
         
-        for section in sections:
-            if len(current_chunk) + len(section) < chunk_size:
-                current_chunk += section + "\n\n"
+        touched = [*sources, *removed]
+        label = ", ".join(touched) if len(touched) <= 3 else f"{len(touched)} sources"
+        logging.info(
+            f"Index generation {number} for {label}: {len(new_ids)} embedded, "
+            f"{len(kept_ids)} reused, {stale_count} removed"
+        )
+        return True
+    
+    @contextmanager
+    def _build_lock(self):
+        """Take the write lock: this process's, plus a file lock in the store
+        directory so processes sharing an on-disk index build one at a time"""
+        with self._lock, _store_lock(self.store_dir):
+            yield
+    
+    def _retire(self, generation: IndexGeneration):
+        generation.retire()
+        if self.store_dir:
+            # Other processes may still be querying it; they move to the new
+            # generation on their next reload or when this one disappears
+            time.sleep(Config.INDEX_RETIRE_GRACE_SECONDS)
+        try:
+            self.client.delete_collection(generation.name)
+        except Exception as e:
+            logging.warning(f"Could not drop index generation {generation.number}: {str(e)}")
+            return
+        logging.info(f"Retired index generation {generation.number}")
+    
+    def _stored_collections(self) -> List:
+        """(number, metadata, name) of every generation collection on the client.
+
+        The unsuffixed collection written before generations existed counts
+        as generation 0.
+        """
+        pattern = re.compile(rf"{re.escape(Config.CHROMA_COLLECTION)}(?:_g(\d+)_[0-9a-f]+)?")
+        found = []
+        for collection in self.client.list_collections():
+            match = pattern.fullmatch(collection.name)
+            if match:
+                number = int(match.group(1)) if match.group(1) is not None else 0
+                found.append((number, collection.metadata or {}, collection.name))
+        return found
+    
+    def _stored_generations(self) -> List:
+        """(number, built_at, name) of finished generations on the client, oldest first"""
+        return sorted(
+            (number, metadata.get("built_at", 0.0), name)
+            for number, metadata, name in self._stored_collections()
+            if number == 0 or "built_at" in metadata
+        )
+    
+    def _drop_abandoned_builds(self):
+        """Delete unfinished builds old enough that no process can still be writing them.
+
+        Called with the build lock held.
+        """
+        now = time.time()
+        for number, metadata, name in self._stored_collections():
+            if number and "built_at" not in metadata and \
+                    now - metadata.get("started_at", 0.0) > Config.INDEX_BUILD_GRACE_SECONDS:
+                logging.info(f"Dropping abandoned index build {name}")
+                self.client.delete_collection(name)
+    
+    def _adopt_latest(self) -> Optional[IndexGeneration]:
+        """Switch to the newest finished generation in the store, if it is not the current one.
+
+        That is the index left by a previous run, or one another process
+        built. The generation it replaces is not dropped here: whoever
+        built the newer one does that.
+        """
+        with self._lock:
+            stored = self._stored_generations()
+            current = self._generation
+            if not stored or (current is not None and current.name == stored[-1][2]):
+                return current
+            number, _, name = stored[-1]
+            collection = self.client.get_collection(name=name, embedding_function=self.embedding_function)
+            indexed = collection.get(include=["documents", "metadatas"])
+            self._generation = IndexGeneration(
+                number, collection,
+                BM25Index(indexed['ids'], indexed['documents'], indexed['metadatas']),
+                self._fingerprint(indexed['ids'])
+            )
+            if current is not None:
+                self.index_version += 1
+                logging.info(f"Adopted index generation {number} built by another process")
+            return self._generation
+    
+    def _ensure_generation(self) -> IndexGeneration:
+        """Open the stored index when load_sop has not run in this process"""
+        generation = self._generation
+        if generation is None:
+            generation = self._adopt_latest()
+            if generation is None:
+                raise ValueError(f"No index has been built for {Config.CHROMA_COLLECTION}")
+        return generation
+    
+    def _dropped_elsewhere(self, generation: IndexGeneration) -> bool:
+        try:
+            return generation.name not in {collection.name for collection in self.client.list_collections()}
+        except Exception:
+            return False
+    
+    def _readopt(self, generation: Optional[IndexGeneration]) -> bool:
+        """After a failed read: if the process that replaced this generation
+        dropped its collection, adopt the newest one. True means retry."""
+        if generation is None or not self._dropped_elsewhere(generation):
+            return False
+        logging.warning(f"Index generation {generation.number} was dropped by another process")
+        return self._adopt_latest() not in (None, generation)
+    
+    @contextmanager
+    def _reading(self):
+        """Pin the current generation for one query; a reload retiring it
+        waits for the query to finish before dropping its collection"""
+        while True:
+            generation = self._ensure_generation()
+            if generation.acquire():
+                break
+        try:
+            yield generation
+        finally:
+            generation.release()
+    
+    def drop_index(self):
+        """Delete every stored generation, e.g. to time a load from scratch"""
+        with self._build_lock():
+            for _, _, name in self._stored_collections():
+                self.client.delete_collection(name)
+            self._generation = None
+            self.index_version += 1
+    
+    def warm_up(self):
+        """Open the index and run one embedding so the first real query is fast"""
+        self._ensure_generation()
+        self.embedding_function(["warm up"])
+        self.ready = True
+        logging.info("RAG engine warmed up")
+    
+    def readiness(self) -> Dict:
+        """Readiness details for health checks"""
+        generation = self._generation
+        return {
+            "ready": self.ready,
+            # From the BM25 index, so a generation dropped by another process cannot fail this
+            "chunks": len(generation.bm25.ids) if generation is not None else 0,
+            "index_generation": generation.number if generation is not None else None,
+            "index_fingerprint": generation.fingerprint if generation is not None else None,
+            "last_reload": (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.last_reload))
+                            if self.last_reload else None),
+            "embedding_model": Config.EMBEDDING_MODEL
+        }
+    
+    def _scope(self, category: Optional[str], generation: Optional[IndexGeneration] = None):
+        """Where-filter and matching BM25 predicate for a task category"""
+        generation = generation or self._generation
+        bm25 = generation.bm25 if generation is not None else None
+        scope = Config.CATEGORY_SCOPES.get(category) if category else None
+        if not scope or bm25 is None:
+            return None, None
+        
+        indexed = {metadata.get("source") for metadata in bm25.metadatas}
+        scope = {source: sections for source, sections in scope.items() if source in indexed}
+        if not scope:
+            return None, None
+        
+        clauses = []
+        for source, sections in scope.items():
+            if sections:
+                clauses.append({"$and": [{"source": source}, {"section_number": {"$in": sections}}]})
             else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = section + "\n\n"
+                clauses.append({"source": source})
+        where = clauses[0] if len(clauses) == 1 else {"$or": clauses}
         
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        def accept(metadata: Dict) -> bool:
+            source = metadata.get("source")
+            if source not in scope:
+                return False
+            return scope[source] is None or metadata.get("section_number") in scope[source]
         
-        return chunks
+        return where, accept
     
-    def query(self, query_text: str, n_results: int = 3) -> List[str]:
-        """Query vector database for relevant SOP chunks"""
+    def filter_scope(self, hits: List[Dict], category: Optional[str]) -> List[Dict]:
+        """Hits that fall inside the category's SOP scope (all of them for unscoped categories)"""
+        _, accept = self._scope(category)
+        if accept is None:
+            return hits
+        return [hit for hit in hits if accept(hit['metadata'])]
+    
+    def retrieve(self, query_text: str, n_results: int = 3, category: Optional[str] = None,
+                 query_embedding: Optional[List[float]] = None) -> List[Dict]:
+        """Retrieval entry point for the pipeline: hybrid when enabled, dense
+        otherwise, gated by RAG_MAX_DISTANCE so off-topic input returns nothing"""
+        if Config.HYBRID_RETRIEVAL:
+            return self.hybrid_query(query_text, n_results, category, query_embedding, Config.RAG_MAX_DISTANCE)
+        return self.query_with_scores(query_text, n_results, query_embedding, Config.RAG_MAX_DISTANCE)
+    
+    def hybrid_query(self, query_text: str, n_results: int = 3, category: Optional[str] = None,
+                     query_embedding: Optional[List[float]] = None,
+                     max_distance: Optional[float] = None) -> List[Dict]:
+        """BM25 + dense retrieval fused with reciprocal rank fusion.
+
+        When the category maps to known sources/sections, both candidate
+        lists are restricted to them; if that leaves nothing, the search is
+        retried over the whole collection. With max_distance set, fused
+        hits are gated on their dense distance.
+        """
+        hits = self._hybrid_query(query_text, n_results, category, query_embedding)
+        if max_distance is not None:
+            hits = self.filter_relevant(hits, max_distance)
+        return hits
+    
+    def _hybrid_query(self, query_text: str, n_results: int, category: Optional[str],
+                      query_embedding: Optional[List[float]]) -> List[Dict]:
+        generation = None
         try:
-            if not self.collection:
-                self.collection = self.client.get_collection(
-                    name=Config.CHROMA_COLLECTION,
-                    embedding_function=self.embedding_function
-                )
+            with self._reading() as generation:
+                cache_key = f"{QueryCache.normalize(query_text)}\x00hybrid\x00{category or ''}"
+                fingerprint = generation.fingerprint
+                cached = self.query_cache.get_results(cache_key, n_results, fingerprint)
+                if cached is not None:
+                    return cached
+                
+                if query_embedding is None:
+                    query_embedding = self.embed_query(query_text)
+                
+                where, accept = self._scope(category, generation)
+                hits = self._hybrid_search(generation, query_text, query_embedding, n_results, where, accept)
+                if not hits and where is not None:
+                    logging.info(f"No chunks in scope for {category}, searching all sources")
+                    hits = self._hybrid_search(generation, query_text, query_embedding, n_results, None, None)
+                
+                logging.info(f"Hybrid query for '{query_text}' (category {category}): {len(hits)} chunks")
+                self.query_cache.put_results(cache_key, n_results, fingerprint, query_embedding, hits)
+                return hits
             
-            logging.info(f"Querying RAG for: {query_text}")
-            
-            results = self.collection.query(
-                query_texts=[query_text],
-                n_results=n_results
+        except Exception as e:
+            if self._readopt(generation):
+                return self._hybrid_query(query_text, n_results, category, query_embedding)
+            logging.error(f"Error in hybrid query: {str(e)}")
+            return []
+    
+    def _hybrid_search(self, generation: IndexGeneration, query_text: str, query_embedding: List[float],
+                       n_results: int, where: Optional[Dict], accept) -> List[Dict]:
+        bm25 = generation.bm25
+        candidates = max(Config.HYBRID_CANDIDATES, n_results)
+        
+        with stage_timer("vector_search"):
+            dense = generation.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=min(candidates, len(bm25.ids)) if bm25 else candidates,
+                where=where,
+                include=["documents", "distances", "metadatas"]
             )
+        
+        fused = {}
+        for rank, (chunk_id, document, distance, metadata) in enumerate(zip(
+                dense['ids'][0], dense['documents'][0], dense['distances'][0], dense['metadatas'][0])):
+            fused[chunk_id] = {
+                "document": document,
+                "distance": distance,
+                "metadata": metadata,
+                "score": 1.0 / (Config.RRF_K + rank + 1)
+            }
+        
+        if bm25 is not None:
+            with stage_timer("bm25_search"):
+                sparse = bm25.search(query_text, candidates, accept)
+            for rank, (index, _) in enumerate(sparse):
+                chunk_id = bm25.ids[index]
+                hit = fused.setdefault(chunk_id, {
+                    "document": bm25.documents[index],
+                    "distance": None,
+                    "metadata": bm25.metadatas[index],
+                    "score": 0.0
+                })
+                hit["score"] += 1.0 / (Config.RRF_K + rank + 1)
+        
+        top = sorted(fused.items(), key=lambda item: item[1]["score"], reverse=True)[:n_results]
+        
+        # Keyword-only hits get their dense distance too, so relevance gating treats all hits alike
+        missing = [chunk_id for chunk_id, hit in top if hit["distance"] is None]
+        if missing:
+            stored = generation.collection.get(ids=missing, include=["embeddings"])
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            for chunk_id, embedding in zip(stored['ids'], stored['embeddings']):
+                diff = np.asarray(embedding, dtype=np.float32) - query_vector
+                fused[chunk_id]["distance"] = float(diff @ diff)
+        
+        return [hit for _, hit in top]
+    
+    @staticmethod
+    def _fingerprint(ids: List[str]) -> str:
+        ids = sorted(ids)
+        return hashlib.sha256("\n".join(ids).encode('utf-8')).hexdigest()[:32]
+    
+    @staticmethod
+    def _chunk_id(source: str, chunk: str) -> str:
+        """Content-addressed chunk id, scoped to the source document"""
+        return hashlib.sha256(f"{source}\n{chunk}".encode('utf-8')).hexdigest()[:32]
+    
+    def _chunk_document(self, content: str, chunk_size: int = None) -> List[str]:
+        """Split document into chunks along its numbered sections"""
+        return [text for text, _ in self._chunk_sections(content, chunk_size)]
+    
+    def _chunk_sections(self, content: str, chunk_size: int = None):
+        """Section-aware chunks as (text, section metadata) pairs"""
+        return chunk_sop(
+            content,
+            chunk_size=chunk_size or Config.CHUNK_SIZE,
+            overlap=Config.CHUNK_OVERLAP
+        )
+    
+    def query(self, query_text: str, n_results: int = 3,
+              query_embedding: Optional[List[float]] = None,
+              max_distance: Optional[float] = None) -> List[str]:
+        """Query vector database for relevant SOP chunks"""
+        return [
+            hit['document']
+            for hit in self.query_with_scores(query_text, n_results, query_embedding, max_distance)
+        ]
+    
+    @staticmethod
+    def filter_relevant(hits: List[Dict], max_distance: float, margin: float = None) -> List[Dict]:
+        """Drop hits beyond max_distance, and (adaptive k) hits far behind the best one"""
+        margin = Config.RAG_DISTANCE_MARGIN if margin is None else margin
+        scored = [hit for hit in hits if hit['distance'] is not None and hit['distance'] <= max_distance]
+        if not scored:
+            return []
+        best = min(hit['distance'] for hit in scored)
+        return [hit for hit in scored if hit['distance'] <= best + margin]
+    
+    def embed_query(self, query_text: str) -> List[float]:
+        """Embed a single query, reusing the cached vector for repeated text"""
+        key = QueryCache.normalize(query_text)
+        embedding = self.query_cache.get_embedding(key)
+        if embedding is None:
+            with stage_timer("embed"):
+                embedding = [float(x) for x in self.embedding_function([query_text])[0]]
+            self.query_cache.put_embedding(key, embedding)
+        return embedding
+    
+    def embed_queries(self, query_texts: List[str]) -> List[List[float]]:
+        """Embed many queries, encoding all uncached texts in a single batch"""
+        keys = [QueryCache.normalize(text) for text in query_texts]
+        embeddings = [self.query_cache.get_embedding(key) for key in keys]
+        
+        missing = {}
+        for key, text, embedding in zip(keys, query_texts, embeddings):
+            if embedding is None and key not in missing:
+                missing[key] = text
+        
+        if missing:
+            with stage_timer("embed"):
+                encoded = self.embedding_function(list(missing.values()))
+            fresh = {}
+            for key, vector in zip(missing, encoded):
+                fresh[key] = [float(x) for x in vector]
+                self.query_cache.put_embedding(key, fresh[key])
+            embeddings = [embedding if embedding is not None else fresh[key]
+                          for key, embedding in zip(keys, embeddings)]
+        
+        return embeddings
+    
+    def query_batch(self, query_texts: List[str], n_results: int = 3) -> List[List[Dict]]:
+        """Query for many texts with one embedding batch and one vector search"""
+        if not query_texts:
+            return []
+        generation = None
+        try:
+            with self._reading() as generation:
+                logging.info(f"Batch querying RAG for {len(query_texts)} queries")
+                
+                embeddings = self.embed_queries(query_texts)
+                with stage_timer("vector_search"):
+                    results = generation.collection.query(
+                        query_embeddings=embeddings,
+                        n_results=n_results,
+                        include=["documents", "distances", "metadatas"]
+                    )
+                
+                batch = []
+                for i, (query_text, embedding) in enumerate(zip(query_texts, embeddings)):
+                    hits = [
+                        {"document": document, "distance": distance, "metadata": metadata}
+                        for document, distance, metadata in zip(
+                            results['documents'][i], results['distances'][i], results['metadatas'][i]
+                        )
+                    ]
+                    self.query_cache.put_results(
+                        QueryCache.normalize(query_text), n_results, generation.fingerprint, embedding, hits
+                    )
+                    batch.append(hits)
+                return batch
             
-            documents = results['documents'][0] if results['documents'] else []
-            logging.info(f"Found {len(documents)} relevant chunks")
-            
-            return documents
+        except Exception as e:
+            if self._readopt(generation):
+                return self.query_batch(query_texts, n_results)
+            logging.error(f"Error batch querying RAG: {str(e)}")
+            return [[] for _ in query_texts]
+    
+    async def aload_sop(self, filepath: str):
+        """Async variant of load_sop, run on the shared executor"""
+        return await run_blocking(self.load_sop, filepath)
+    
+    async def aquery(self, query_text: str, n_results: int = 3) -> List[str]:
+        """Async variant of query, run on the shared executor"""
+        return await run_blocking(self.query, query_text, n_results)
+    
+    async def aquery_with_scores(self, query_text: str, n_results: int = 3) -> List[Dict]:
+        """Async variant of query_with_scores, run on the shared executor"""
+        return await run_blocking(self.query_with_scores, query_text, n_results)
+    
+    def query_with_scores(self, query_text: str, n_results: int = 3,
+                          query_embedding: Optional[List[float]] = None,
+                          max_distance: Optional[float] = None) -> List[Dict]:
+        """Query vector database, returning chunks with their distances and metadata.
+
+        Pass query_embedding when the caller already encoded query_text.
+        With max_distance set, only relevant chunks are returned (possibly none).
+        """
+        hits = self._query_with_scores(query_text, n_results, query_embedding)
+        if max_distance is not None:
+            hits = self.filter_relevant(hits, max_distance)
+        return hits
+    
+    def _query_with_scores(self, query_text: str, n_results: int,
+                           query_embedding: Optional[List[float]]) -> List[Dict]:
+        generation = None
+        try:
+            with self._reading() as generation:
+                logging.info(f"Querying RAG for: {query_text}")
+                
+                cache_key = QueryCache.normalize(query_text)
+                fingerprint = generation.fingerprint
+                cached = self.query_cache.get_results(cache_key, n_results, fingerprint)
+                if cached is not None:
+                    logging.info(f"Query cache hit, {len(cached)} chunks")
+                    return cached
+                
+                if query_embedding is None:
+                    query_embedding = self.embed_query(query_text)
+                
+                with stage_timer("vector_search"):
+                    results = generation.collection.query(
+                        query_embeddings=[query_embedding],
+                        n_results=n_results,
+                        include=["documents", "distances", "metadatas"]
+                    )
+                
+                documents = results['documents'][0] if results['documents'] else []
+                distances = results['distances'][0] if results['distances'] else [None] * len(documents)
+                metadatas = results['metadatas'][0] if results['metadatas'] else [{}] * len(documents)
+                logging.info(f"Found {len(documents)} relevant chunks")
+                
+                hits = [
+                    {"document": document, "distance": distance, "metadata": metadata}
+                    for document, distance, metadata in zip(documents, distances, metadatas)
+                ]
+                self.query_cache.put_results(cache_key, n_results, fingerprint, query_embedding, hits)
+                return hits
             
         except Exception as e:
+            if self._readopt(generation):
+                return self._query_with_scores(query_text, n_results, query_embedding)
             logging.error(f"Error querying RAG: {str(e)}")
-            return []
\ No newline at end of file
+            return []
+
+
+_shared_engine = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_engine(sop_path: str = None) -> RAGEngine:
+    """Process-wide RAGEngine, loaded and warmed on first use.
+
+    The Streamlit app and the bot share this one instance (and so one
+    embedding model and one vector store client) per process. Without
+    sop_path the whole SOP_DIR corpus is indexed.
+    """
+    global _shared_engine
+    if _shared_engine is None:
+        with _shared_lock:
+            if _shared_engine is None:
+                engine = RAGEngine()
+                if sop_path:
+                    engine.load_sop(sop_path)
+                else:
+                    engine.load_corpus(Config.SOP_DIR)
+                engine.warm_up()
+                _shared_engine = engine
+    return _shared_engine
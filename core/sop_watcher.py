@@ -0,0 +1,93 @@
+import logging
+import os
+import threading
+from typing import Dict, Tuple
+from .config import Config
+
+logging.basicConfig(
+    filename=Config.LOG_FILE,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+
+class SopWatcher:
+    """Polls the indexed SOP file (or corpus directory) and hot-reloads the engine.
+
+    Files are compared by mtime and size on every poll. A change is only
+    acted on once two consecutive polls agree, so an editor that is still
+    writing a file does not trigger a reload of half its content. The
+    reload runs on this thread and builds a new index generation while
+    queries keep being answered from the current one.
+    """
+
+    def __init__(self, engine, path: str, pattern: str = "*.txt", interval: float = None):
+        self.engine = engine
+        self.path = path
+        self.pattern = pattern
+        self.interval = Config.SOP_WATCH_INTERVAL_SECONDS if interval is None else interval
+        self.reloads = 0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def snapshot(self) -> Dict[str, Tuple[int, int]]:
+        """path -> (mtime_ns, size) of every watched file"""
+        if os.path.isfile(self.path):
+            paths = [self.path]
+        else:
+            paths = self.engine._corpus_paths(self.path, self.pattern)
+
+        state = {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # removed between listing and stat
+            state[path] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sop-watcher", daemon=True)
+        self._thread.start()
+        logging.info(f"Watching {self.path} for SOP changes every {self.interval}s")
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        indexed = self.snapshot()
+        pending = None
+        while not self._stop.wait(self.interval):
+            current = self.snapshot()
+            if current == indexed:
+                pending = None
+                continue
+            if current != pending:
+                # Still changing (or just changed); wait for it to settle
+                pending = current
+                continue
+
+            changed = sorted(path for path, stat in current.items() if indexed.get(path) != stat)
+            removed = sorted(indexed.keys() - current.keys())
+            try:
+                if self.engine.reload_paths(changed, removed):
+                    self.reloads += 1
+                    logging.info(f"Reloaded SOPs: {len(changed)} changed, {len(removed)} removed")
+            except Exception as e:
+                # Keep the old snapshot so the next poll retries
+                self.errors += 1
+                logging.error(f"SOP reload failed, retrying: {str(e)}")
+                continue
+            indexed = current
+            pending = None
+
+    def stats(self) -> Dict:
+        return {
+            "reloads": self.reloads,
+            "errors": self.errors,
+            "interval_seconds": self.interval,
+            "index_version": self.engine.index_version,
+        }
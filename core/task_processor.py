@@ -1,9 +1,21 @@
+import asyncio
+import contextvars
 import json
 import logging
-from groq import Groq
-from typing import Dict, List
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 from .config import Config
 from .rag_engine import RAGEngine
+from .async_utils import get_speculation_executor, run_blocking, iterate_blocking
+from .answer_cache import SemanticAnswerCache
+from .llm_client import get_llm_client
+from .fast_classifier import FastTaskClassifier
+from .context_packer import ContextPacker
+from .bm25 import tokenize
+from .metrics import FALLBACKS, REGISTRY, STAGE_SECONDS, current_trace_id
+from .idempotency import DONE, NEW, PENDING, IdempotencyStore
 
 logging.basicConfig(
     filename=Config.LOG_FILE,
@@ -11,19 +23,101 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+NO_SOP_ANSWER = "I could not find relevant information in the SOP documents."
+FUSED_FIELDS = {
+    "title": None,
+    "priority": "medium",
+    "category": "general",
+    "deadline_hint": "not specified",
+}
+ERROR_ANSWER = "An error occurred while processing your question."
+PENDING_DUPLICATE_ERROR = "An identical request is already being processed."
+ENRICH_INTERRUPTED_NOTICE = "\n\n(The description was cut off, so the task uses its title instead.)"
+
+
+class StreamInterruptedError(RuntimeError):
+    """A streamed completion failed after some tokens were already yielded"""
+
+
+@dataclass
+class TaskResult:
+    """Outcome of each pipeline stage for a single task request"""
+    request: str
+    parsed: Dict = field(default_factory=dict)
+    sop_chunks: List[Dict] = field(default_factory=list)
+    enriched_description: str = ""
+    task: Optional[Dict] = None
+    error: Optional[str] = None
+    # Seconds per stage; "total" is set once the task has been created (or failed)
+    timings: Dict[str, float] = field(default_factory=dict)
+    trace_id: str = field(default_factory=current_trace_id)
+    # DONE: repeat of a finished request (task is the earlier one); PENDING: still in flight
+    duplicate: Optional[str] = None
+    # Hex key of this request's idempotency claim, settled by create_task
+    idempotency_key: Optional[str] = None
+    started_at: float = field(default_factory=time.perf_counter, repr=False)
+
+    def mark(self, stage: str, since: float) -> float:
+        """Record the time spent in a stage since `since` and return the current clock"""
+        now = time.perf_counter()
+        self.timings[stage] = round(now - since, 4)
+        STAGE_SECONDS.observe(now - since, stage="task_total" if stage == "total" else stage)
+        return now
+
+    def finish(self):
+        self.mark("total", self.started_at)
+
+    @property
+    def sop_documents(self) -> List[str]:
+        return [chunk['document'] for chunk in self.sop_chunks]
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        del data['started_at']
+        return data
+
+
 class TaskProcessor:
     def __init__(self, rag_engine):
         if rag_engine is None:
             raise ValueError("TaskProcessor requires a RAGEngine instance")
         self.rag_engine = rag_engine
-        self.groq_client = Groq(api_key=Config.GROQ_API_KEY)
+        self.llm = get_llm_client()
+        self.answer_cache = SemanticAnswerCache()
+        self.fast_classifier = FastTaskClassifier(rag_engine)
+        self.context_packer = ContextPacker(rag_engine)
+        # "two_call" parses then enriches; "fused" does both in one JSON completion
+        self.pipeline_mode = Config.TASK_PIPELINE_MODE
+        # Groq calls avoided because no SOP chunk cleared the relevance gate
+        self.skipped_llm_calls = 0
+        # Speculative raw-message retrievals that were reused vs. re-queried after parse
+        self.speculation = {"reused": 0, "requeried": 0}
+        self.idempotency = IdempotencyStore() if Config.IDEMPOTENCY_ENABLED else None
+        
+        REGISTRY.register_collector("answer_cache", self.answer_cache.stats)
+        REGISTRY.register_collector("query_cache", rag_engine.query_cache.stats)
+        REGISTRY.register_collector("fast_parse", self.fast_classifier.stats)
+        REGISTRY.register_collector("context_packing", self.context_packer.stats)
+        REGISTRY.register_collector("groq", self.llm.stats)
+        if self.idempotency is not None:
+            REGISTRY.register_collector("idempotency", self.idempotency.stats)
+        REGISTRY.register_collector("pipeline", lambda: {
+            "skipped_llm_calls": self.skipped_llm_calls,
+            "speculation_reused": self.speculation["reused"],
+            "speculation_requeried": self.speculation["requeried"],
+        })
         
     def parse_request(self, message: str) -> Dict:
         """Extract structured task information from natural language"""
+        if Config.FAST_PARSE_ENABLED:
+            parsed = self.fast_classifier.classify(message)
+            if parsed is not None:
+                return parsed
+        
         try:
             logging.info(f"Parsing request: {message}")
             
-            response = self.groq_client.chat.completions.create(
+            response = self.llm.complete(
                 model=Config.GROQ_MODEL,
                 messages=[
                     {
@@ -49,6 +143,7 @@ class TaskProcessor:
             
         except Exception as e:
             logging.error(f"Error parsing request: {str(e)}")
+            FALLBACKS.inc(reason="parse_error")
             return {
                 "title": message[:100],
                 "priority": "medium",
@@ -56,41 +151,417 @@ class TaskProcessor:
                 "deadline_hint": "not specified"
             }
     
-    def enrich_with_sop(self, parsed_task: Dict) -> str:
+    @staticmethod
+    def task_query(parsed_task: Dict) -> str:
+        """Retrieval query used for a parsed task"""
+        return f"{parsed_task['category']} {parsed_task['title']}"
+    
+    def retrieve_for_task(self, parsed_task: Dict) -> List[Dict]:
+        """SOP chunks for a parsed task, scoped by its category"""
+        return self.rag_engine.retrieve(
+            self.task_query(parsed_task),
+            n_results=Config.RAG_TOP_K,
+            category=parsed_task.get('category')
+        )
+    
+    def speculative_retrieve(self, message: str) -> List[Dict]:
+        """Unscoped retrieval on the raw message, run while the request is being parsed.
+
+        Extra candidates are fetched so enough survive the category scope filter.
+        """
+        return self.rag_engine.retrieve(message, n_results=Config.RAG_TOP_K * 2)
+    
+    def reuse_speculative(self, message: str, parsed_task: Dict, hits: List[Dict]) -> Optional[List[Dict]]:
+        """Speculative hits to keep for the parsed task, or None if it must be re-queried.
+
+        The retrieval query is "<category> <title>"; when the title is mostly
+        drawn from the message itself and the hits fit the category scope, a
+        second query would find essentially the same chunks.
+        """
+        title_terms = set(tokenize(parsed_task['title']))
+        if title_terms:
+            overlap = len(title_terms & set(tokenize(message))) / len(title_terms)
+            if overlap < Config.SPECULATIVE_MIN_OVERLAP:
+                return None
+        scoped = self.rag_engine.filter_scope(hits, parsed_task.get('category'))
+        if not scoped:
+            return None
+        return scoped[:Config.RAG_TOP_K]
+    
+    def _settle_retrieval(self, result: TaskResult, hits: List[Dict]) -> bool:
+        """Apply speculative hits to the result; False means the caller must re-query"""
+        reused = self.reuse_speculative(result.request, result.parsed, hits)
+        if reused is None:
+            self.speculation["requeried"] += 1
+            return False
+        self.speculation["reused"] += 1
+        result.sop_chunks = reused
+        return True
+    
+    def claim_request(self, message: str, scope: Optional[str],
+                      owner: Optional[str] = None) -> Tuple[Optional[str], Optional[TaskResult]]:
+        """Claim a request for its requester (scope, e.g. a chat id).
+
+        Returns (key, None) for a new request, or (None, duplicate) where the
+        duplicate result carries the earlier task or a pending error. A
+        pending claim made by the same owner (e.g. an earlier attempt of the
+        same job) is taken over. Without a scope, or with idempotency
+        disabled, nothing is claimed.
+        """
+        if self.idempotency is None or scope is None:
+            return None, None
+        key = IdempotencyStore.key_for(message, scope)
+        state, stored = self.idempotency.begin(key, owner)
+        if state == NEW:
+            return key.hex(), None
+        if state == DONE:
+            logging.info("Duplicate request, returning the task created earlier")
+            return None, TaskResult(
+                request=message,
+                parsed=stored["parsed"],
+                enriched_description=stored["enriched_description"],
+                task=stored["task"],
+                trace_id=stored.get("trace_id", current_trace_id()),
+                duplicate=DONE
+            )
+        logging.info("Duplicate of a request still in flight")
+        return None, TaskResult(request=message, error=PENDING_DUPLICATE_ERROR, duplicate=PENDING)
+    
+    def settle_claim(self, result: TaskResult):
+        """Record the created task for the request's key, or release the claim on failure"""
+        if self.idempotency is None or result.idempotency_key is None:
+            return
+        key = bytes.fromhex(result.idempotency_key)
+        if result.task and not result.error:
+            # Only what a repeat needs to answer; retrieved chunks are not kept
+            self.idempotency.complete(key, {
+                "parsed": result.parsed,
+                "enriched_description": result.enriched_description,
+                "task": result.task,
+                "trace_id": result.trace_id,
+            })
+        else:
+            self.idempotency.release(key)
+        result.idempotency_key = None
+    
+    def _release_claim(self, key: Optional[str]):
+        if key is not None:
+            self.idempotency.release(bytes.fromhex(key))
+    
+    def release_unsettled(self, result: TaskResult):
+        """Release the claim of a result that never reached create_task"""
+        key, result.idempotency_key = result.idempotency_key, None
+        self._release_claim(key)
+    
+    @contextmanager
+    def holding_claim(self, result: TaskResult):
+        """Hold result's claim from prepare to create.
+
+        Any exit that does not settle it (an exception, a Streamlit rerun,
+        a cancelled handler) releases the claim, so a repeat of the request
+        runs again instead of waiting out the pending timeout.
+        """
+        try:
+            yield result
+        finally:
+            self.release_unsettled(result)
+    
+    def prepare_task(self, message: str, scope: Optional[str] = None, owner: Optional[str] = None) -> TaskResult:
+        """Parse the request and retrieve its SOP context.
+
+        With a scope, a repeat of a recent request from the same requester
+        comes back as a duplicate result without touching Groq or Todoist.
+        The returned result holds a claim until create_task; callers that
+        may stop before then wrap the rest of the flow in holding_claim.
+        """
+        key, duplicate = self.claim_request(message, scope, owner)
+        if duplicate is not None:
+            return duplicate
+        try:
+            if self.pipeline_mode == "fused":
+                result = self.prepare_fused(message)
+            else:
+                result = self._prepare_two_call(message)
+        except Exception:
+            self._release_claim(key)
+            raise
+        result.idempotency_key = key
+        return result
+    
+    def _prepare_two_call(self, message: str) -> TaskResult:
+        result = TaskResult(request=message)
+        clock = result.started_at
+        
+        if not Config.SPECULATIVE_RETRIEVAL:
+            result.parsed = self.parse_request(message)
+            clock = result.mark("parse", clock)
+            result.sop_chunks = self.retrieve_for_task(result.parsed)
+            result.mark("retrieve", clock)
+            return result
+        
+        speculative = get_speculation_executor().submit(
+            contextvars.copy_context().run, self.speculative_retrieve, message
+        )
+        result.parsed = self.parse_request(message)
+        clock = result.mark("parse", clock)
+        if not self._settle_retrieval(result, speculative.result()):
+            result.sop_chunks = self.retrieve_for_task(result.parsed)
+        # Only the retrieval time not hidden behind parsing
+        result.mark("retrieve", clock)
+        return result
+    
+    def prepare_fused(self, message: str) -> TaskResult:
+        """Retrieve on the raw message, then parse and enrich in a single Groq call"""
+        result = TaskResult(request=message)
+        # The category is not known yet, so retrieval is unscoped
+        result.sop_chunks = self.rag_engine.retrieve(message, n_results=Config.RAG_TOP_K)
+        clock = result.mark("retrieve", result.started_at)
+        
+        if not result.sop_chunks:
+            logging.warning("No relevant SOP chunks, parsing without enrichment")
+            self.skipped_llm_calls += 1
+            result.parsed = self.parse_request(message)
+            result.enriched_description = result.parsed['title']
+            result.mark("parse", clock)
+            return result
+        
+        try:
+            logging.info(f"Parsing and enriching request: {message}")
+            
+            response = self.llm.complete(
+                model=Config.GROQ_MODEL,
+                messages=self._fused_messages(message, result.sop_documents),
+                temperature=0.1,
+                response_format={"type": "json_object"}
+            )
+            
+            fused = json.loads(response.choices[0].message.content)
+            parsed = {key: fused.get(key) or default for key, default in FUSED_FIELDS.items()}
+            parsed['title'] = parsed['title'] or message[:100]
+            result.parsed = parsed
+            result.enriched_description = fused.get('description') or parsed['title']
+            logging.info(f"Parsed and enriched task: {parsed}")
+            
+        except Exception as e:
+            logging.error(f"Error in fused parse/enrich, using two-call path: {str(e)}")
+            FALLBACKS.inc(reason="fused_error")
+            result.parsed = self.parse_request(message)
+            result.enriched_description = self.enrich_with_sop(result.parsed, result.sop_documents)
+        
+        result.mark("parse_enrich", clock)
+        return result
+    
+    def enrich_task(self, result: TaskResult) -> TaskResult:
+        """Generate the enriched description from the already retrieved chunks"""
+        if result.enriched_description or result.duplicate:
+            return result
+        clock = time.perf_counter()
+        result.enriched_description = self.enrich_with_sop(result.parsed, result.sop_documents)
+        result.mark("enrich", clock)
+        return result
+    
+    def create_task(self, result: TaskResult, todoist_client) -> TaskResult:
+        """Create the Todoist task, recording any failure on the result"""
+        if result.duplicate:
+            return result
+        clock = time.perf_counter()
+        try:
+            result.task = todoist_client.create_task(result.parsed, result.enriched_description)
+        except Exception as e:
+            logging.error(f"Todoist creation failed: {str(e)}")
+            result.error = str(e)
+        self.settle_claim(result)
+        result.mark("create", clock)
+        result.finish()
+        logging.info(f"Task timings: {result.timings}")
+        return result
+    
+    def process_task(self, message: str, todoist_client, scope: Optional[str] = None,
+                     owner: Optional[str] = None) -> TaskResult:
+        """Run parse -> retrieve -> enrich -> create, each stage exactly once"""
+        result = self.prepare_task(message, scope, owner)
+        with self.holding_claim(result):
+            self.enrich_task(result)
+            return self.create_task(result, todoist_client)
+    
+    async def aparse_request(self, message: str) -> Dict:
+        """Async variant of parse_request"""
+        return await run_blocking(self.parse_request, message)
+    
+    async def aprepare_task(self, message: str, scope: Optional[str] = None,
+                            owner: Optional[str] = None) -> TaskResult:
+        """Async variant of prepare_task"""
+        key, duplicate = await run_blocking(self.claim_request, message, scope, owner)
+        if duplicate is not None:
+            return duplicate
+        try:
+            if self.pipeline_mode == "fused":
+                result = await run_blocking(self.prepare_fused, message)
+            else:
+                result = await self._aprepare_two_call(message)
+        except Exception:
+            await run_blocking(self._release_claim, key)
+            raise
+        result.idempotency_key = key
+        return result
+    
+    async def _aprepare_two_call(self, message: str) -> TaskResult:
+        result = TaskResult(request=message)
+        clock = result.started_at
+        
+        if not Config.SPECULATIVE_RETRIEVAL:
+            result.parsed = await self.aparse_request(message)
+            clock = result.mark("parse", clock)
+            result.sop_chunks = await run_blocking(self.retrieve_for_task, result.parsed)
+            result.mark("retrieve", clock)
+            return result
+        
+        speculative = asyncio.ensure_future(run_blocking(self.speculative_retrieve, message))
+        result.parsed = await self.aparse_request(message)
+        clock = result.mark("parse", clock)
+        if not self._settle_retrieval(result, await speculative):
+            result.sop_chunks = await run_blocking(self.retrieve_for_task, result.parsed)
+        result.mark("retrieve", clock)
+        return result
+    
+    async def aenrich_task(self, result: TaskResult) -> TaskResult:
+        """Async variant of enrich_task"""
+        if result.enriched_description or result.duplicate:
+            return result
+        clock = time.perf_counter()
+        result.enriched_description = await run_blocking(
+            self.enrich_with_sop, result.parsed, result.sop_documents
+        )
+        result.mark("enrich", clock)
+        return result
+    
+    async def acreate_task(self, result: TaskResult, todoist_client) -> TaskResult:
+        """Async variant of create_task"""
+        if result.duplicate:
+            return result
+        clock = time.perf_counter()
+        try:
+            result.task = await todoist_client.acreate_task(result.parsed, result.enriched_description)
+        except Exception as e:
+            logging.error(f"Todoist creation failed: {str(e)}")
+            result.error = str(e)
+        await run_blocking(self.settle_claim, result)
+        result.mark("create", clock)
+        result.finish()
+        logging.info(f"Task timings: {result.timings}")
+        return result
+    
+    async def aprocess_task(self, message: str, todoist_client, scope: Optional[str] = None,
+                            owner: Optional[str] = None) -> TaskResult:
+        """Async variant of process_task"""
+        result = await self.aprepare_task(message, scope, owner)
+        try:
+            await self.aenrich_task(result)
+            return await self.acreate_task(result, todoist_client)
+        finally:
+            await run_blocking(self.release_unsettled, result)
+    
+    async def aanswer_question(self, question: str) -> str:
+        """Async variant of answer_question"""
+        return await run_blocking(self.answer_question, question)
+    
+    def _enrichment_messages(self, parsed_task: Dict, sop_chunks: List[str]) -> List[Dict]:
+        sop_context = self.context_packer.pack(self.task_query(parsed_task), sop_chunks)
+        return [
+            {
+                "role": "system",
+                "content": """You are an assistant that creates task descriptions with SOP reminders.
+                Given a task and relevant SOP context, create a clear description that includes:
+                1. The main task
+                2. Relevant SOP guidelines (bullet points)
+                Keep it concise and actionable."""
+            },
+            {
+                "role": "user",
+                "content": f"""Task: {parsed_task['title']}
+                
+SOP Context:
+{sop_context}
+
+Create a task description with SOP reminders."""
+            }
+        ]
+    
+    def _fused_messages(self, message: str, sop_chunks: List[str]) -> List[Dict]:
+        sop_context = self.context_packer.pack(message, sop_chunks)
+        return [
+            {
+                "role": "system",
+                "content": """Extract task details from the user request and write a task description with SOP reminders.
+                Return ONLY valid JSON with fields: title, priority (low/medium/high), category, deadline_hint, description.
+                Categories: equipment_purchase, software_subscription, travel_booking, meeting_scheduling, document_request, general.
+                The description states the main task, then the relevant SOP guidelines as bullet points. Keep it concise and actionable.
+                Return format: {"title": "...", "priority": "...", "category": "...", "deadline_hint": "...", "description": "..."}"""
+            },
+            {
+                "role": "user",
+                "content": f"""Request: {message}
+                
+SOP Context:
+{sop_context}"""
+            }
+        ]
+    
+    def _answer_messages(self, question: str, sop_chunks: List[str]) -> List[Dict]:
+        sop_context = self.context_packer.pack(question, sop_chunks)
+        return [
+            {
+                "role": "system",
+                "content": """You are a helpful assistant that answers questions based on SOP documentation.
+                Use only the provided context to answer. Be concise and cite the SOP section when possible.
+                If the answer is not in the context, say so."""
+            },
+            {
+                "role": "user",
+                "content": f"""Question: {question}
+                
+SOP Context:
+{sop_context}
+
+Answer the question based on the SOP context."""
+            }
+        ]
+    
+    def _stream_completion(self, messages: List[Dict], temperature: float) -> Iterator[str]:
+        """Yield completion tokens as Groq streams them"""
+        stream = self.llm.stream(
+            model=Config.GROQ_MODEL,
+            messages=messages,
+            temperature=temperature
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
+    def astream_enrichment(self, result: TaskResult) -> AsyncIterator[str]:
+        """Async variant of stream_enrichment"""
+        return iterate_blocking(self.stream_enrichment(result))
+    
+    def aanswer_question_stream(self, question: str) -> AsyncIterator[str]:
+        """Async variant of answer_question_stream"""
+        return iterate_blocking(self.answer_question_stream(question))
+    
+    def enrich_with_sop(self, parsed_task: Dict, sop_chunks: Optional[List[str]] = None) -> str:
         """Generate enriched task description with SOP guidelines"""
         try:
             logging.info(f"Enriching task with SOP for category: {parsed_task['category']}")
             
-            query = f"{parsed_task['category']} {parsed_task['title']}"
-            sop_chunks = self.rag_engine.query(query, n_results=3)
+            if sop_chunks is None:
+                sop_chunks = [hit['document'] for hit in self.retrieve_for_task(parsed_task)]
             
             if not sop_chunks:
-                logging.warning("No SOP chunks found, proceeding without enrichment")
+                logging.warning("No relevant SOP chunks, skipping enrichment LLM call")
+                self.skipped_llm_calls += 1
                 return parsed_task['title']
             
-            sop_context = "\n\n".join(sop_chunks)
-            
-            response = self.groq_client.chat.completions.create(
+            response = self.llm.complete(
                 model=Config.GROQ_MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """You are an assistant that creates task descriptions with SOP reminders.
-                        Given a task and relevant SOP context, create a clear description that includes:
-                        1. The main task
-                        2. Relevant SOP guidelines (bullet points)
-                        Keep it concise and actionable."""
-                    },
-                    {
-                        "role": "user",
-                        "content": f"""Task: {parsed_task['title']}
-                        
-SOP Context:
-{sop_context}
-
-Create a task description with SOP reminders."""
-                    }
-                ],
+                messages=self._enrichment_messages(parsed_task, sop_chunks),
                 temperature=0.2
             )
             
@@ -101,47 +572,132 @@ Create a task description with SOP reminders."""
             
         except Exception as e:
             logging.error(f"Error enriching task: {str(e)}")
+            FALLBACKS.inc(reason="enrich_error")
             return parsed_task['title']
     
+    def enrich_with_sop_stream(self, parsed_task: Dict, sop_chunks: Optional[List[str]] = None) -> Iterator[str]:
+        """Streaming variant of enrich_with_sop, yielding tokens as they arrive.
+
+        Raises StreamInterruptedError if the stream fails after tokens were yielded.
+        """
+        emitted = False
+        try:
+            logging.info(f"Streaming SOP enrichment for category: {parsed_task['category']}")
+            
+            if sop_chunks is None:
+                sop_chunks = [hit['document'] for hit in self.retrieve_for_task(parsed_task)]
+            
+            if not sop_chunks:
+                logging.warning("No relevant SOP chunks, skipping enrichment LLM call")
+                self.skipped_llm_calls += 1
+                yield parsed_task['title']
+                return
+            
+            for token in self._stream_completion(self._enrichment_messages(parsed_task, sop_chunks), 0.2):
+                emitted = True
+                yield token
+            logging.info("Task enriched with SOP guidelines")
+            
+        except Exception as e:
+            logging.error(f"Error enriching task: {str(e)}")
+            FALLBACKS.inc(reason="enrich_error")
+            if emitted:
+                # The tokens already sent are a truncated description; let the caller discard them
+                raise StreamInterruptedError(str(e)) from e
+            yield parsed_task['title']
+    
+    def stream_enrichment(self, result: TaskResult) -> Iterator[str]:
+        """Stream the enrichment stage, storing the full description on the result"""
+        if result.enriched_description or result.duplicate:
+            # Fused mode (or the earlier run, for a duplicate) already produced the description
+            if result.enriched_description:
+                yield result.enriched_description
+            return
+        clock = time.perf_counter()
+        tokens = []
+        try:
+            for token in self.enrich_with_sop_stream(result.parsed, result.sop_documents):
+                tokens.append(token)
+                yield token
+            result.enriched_description = "".join(tokens)
+        except StreamInterruptedError:
+            # The partial text was shown but is never stored or sent to Todoist
+            result.enriched_description = result.parsed['title']
+            yield ENRICH_INTERRUPTED_NOTICE
+        result.mark("enrich", clock)
+    
     def answer_question(self, question: str) -> str:
         """Answer SOP-related questions using RAG"""
         try:
             logging.info(f"Answering question: {question}")
             
-            sop_chunks = self.rag_engine.query(question, n_results=3)
+            index_version = self.rag_engine.index_version
+            embedding = self.rag_engine.embed_query(question)
+            cached = self.answer_cache.lookup(embedding, index_version)
+            if cached is not None:
+                return cached
             
-            if not sop_chunks:
-                return "I could not find relevant information in the SOP documents."
+            sop_chunks = [
+                hit['document']
+                for hit in self.rag_engine.retrieve(question, Config.RAG_TOP_K, query_embedding=embedding)
+            ]
             
-            sop_context = "\n\n".join(sop_chunks)
+            if not sop_chunks:
+                logging.info("No relevant SOP chunks, skipping answer LLM call")
+                self.skipped_llm_calls += 1
+                return NO_SOP_ANSWER
             
-            response = self.groq_client.chat.completions.create(
+            response = self.llm.complete(
                 model=Config.GROQ_MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """You are a helpful assistant that answers questions based on SOP documentation.
-                        Use only the provided context to answer. Be concise and cite the SOP section when possible.
-                        If the answer is not in the context, say so."""
-                    },
-                    {
-                        "role": "user",
-                        "content": f"""Question: {question}
-                        
-SOP Context:
-{sop_context}
-
-Answer the question based on the SOP context."""
-                    }
-                ],
+                messages=self._answer_messages(question, sop_chunks),
                 temperature=0.1
             )
             
             answer = response.choices[0].message.content
+            self.answer_cache.store(embedding, answer, index_version)
             logging.info("Question answered successfully")
             
             return answer
             
         except Exception as e:
             logging.error(f"Error answering question: {str(e)}")
-            return "An error occurred while processing your question."
\ No newline at end of file
+            FALLBACKS.inc(reason="answer_error")
+            return ERROR_ANSWER
+    
+    def answer_question_stream(self, question: str) -> Iterator[str]:
+        """Streaming variant of answer_question, yielding tokens as they arrive"""
+        emitted = False
+        try:
+            logging.info(f"Streaming answer for question: {question}")
+            
+            index_version = self.rag_engine.index_version
+            embedding = self.rag_engine.embed_query(question)
+            cached = self.answer_cache.lookup(embedding, index_version)
+            if cached is not None:
+                yield cached
+                return
+            
+            sop_chunks = [
+                hit['document']
+                for hit in self.rag_engine.retrieve(question, Config.RAG_TOP_K, query_embedding=embedding)
+            ]
+            
+            if not sop_chunks:
+                logging.info("No relevant SOP chunks, skipping answer LLM call")
+                self.skipped_llm_calls += 1
+                yield NO_SOP_ANSWER
+                return
+            
+            tokens = []
+            for token in self._stream_completion(self._answer_messages(question, sop_chunks), 0.1):
+                emitted = True
+                tokens.append(token)
+                yield token
+            self.answer_cache.store(embedding, "".join(tokens), index_version)
+            logging.info("Question answered successfully")
+            
+        except Exception as e:
+            logging.error(f"Error answering question: {str(e)}")
+            FALLBACKS.inc(reason="answer_error")
+            if not emitted:
+                yield ERROR_ANSWER
@@ -1,7 +1,14 @@
+import hashlib
+import json
 import logging
-from todoist_api_python.api import TodoistAPI
-from typing import Dict
+import random
+import time
+import uuid
+import httpx
+from typing import Dict, List, Optional, Tuple
 from .config import Config
+from .async_utils import run_blocking
+from .metrics import RETRIES, stage_timer
 
 logging.basicConfig(
     filename=Config.LOG_FILE,
@@ -9,9 +16,20 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+MAX_COMMANDS_PER_SYNC = 100  # Sync API limit per request
+
 class TodoistClient:
     def __init__(self):
-        self.api = TodoistAPI(Config.TODOIST_API_KEY)
+        # One keep-alive session shared by all writes (httpx.Client is thread-safe)
+        self.session = httpx.Client(
+            headers={"Authorization": f"Bearer {Config.TODOIST_API_KEY}"},
+            timeout=Config.TODOIST_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=Config.TODOIST_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.TODOIST_MAX_CONNECTIONS
+            )
+        )
         self.priority_map = {
             "low": 1,
             "medium": 2,
@@ -21,26 +39,135 @@ class TodoistClient:
     
     def create_task(self, parsed_task: Dict, description: str) -> Dict:
         """Create task in Todoist with enriched description"""
+        logging.info(f"Creating Todoist task: {parsed_task['title']}")
+        
+        result = self.create_tasks([(parsed_task, description)])[0]
+        if "error" in result:
+            logging.error(f"Error creating Todoist task: {result['error']}")
+            raise RuntimeError(result["error"])
+        
+        logging.info(f"Task created successfully: ID {result['id']}")
+        return result
+    
+    def create_tasks(self, items: List[Tuple[Dict, str]], keys: Optional[List[str]] = None) -> List[Dict]:
+        """Create many tasks through batched Sync API item_add commands.
+
+        keys, if given, name each item stably across runs (e.g. input file
+        and line). The command ids are derived from them, so replaying an
+        item whose task was already created is dropped by Todoist instead
+        of creating it twice.
+
+        Returns one dict per item, in order: the created task, or {"error": ...}.
+        """
+        keys = keys or [None] * len(items)
+        results = []
+        for start in range(0, len(items), MAX_COMMANDS_PER_SYNC):
+            end = start + MAX_COMMANDS_PER_SYNC
+            results.extend(self._create_batch(items[start:end], keys[start:end]))
+        return results
+    
+    @staticmethod
+    def _command_ids(key: Optional[str]) -> Tuple[str, str]:
+        """(temp_id, uuid) for an item_add command; random without a key"""
+        if key is None:
+            return str(uuid.uuid4()), str(uuid.uuid4())
+        digest = hashlib.sha256(key.encode("utf-8")).digest()
+        return str(uuid.UUID(bytes=digest[:16], version=4)), str(uuid.UUID(bytes=digest[16:], version=4))
+    
+    def _create_batch(self, items: List[Tuple[Dict, str]], keys: List[Optional[str]]) -> List[Dict]:
+        commands = []
+        for (parsed_task, description), key in zip(items, keys):
+            temp_id, command_uuid = self._command_ids(key)
+            commands.append({
+                "type": "item_add",
+                "temp_id": temp_id,
+                # Stable across retries, so the server applies each command at most once
+                "uuid": command_uuid,
+                "args": {
+                    "content": parsed_task['title'],
+                    "description": description,
+                    "priority": self.priority_map.get(parsed_task.get('priority', 'medium'), 2)
+                }
+            })
+        
         try:
-            logging.info(f"Creating Todoist task: {parsed_task['title']}")
-            
-            priority = self.priority_map.get(parsed_task.get('priority', 'medium'), 2)
-            
-            task = self.api.add_task(
-                content=parsed_task['title'],
-                description=description,
-                priority=priority
-            )
-            
-            logging.info(f"Task created successfully: ID {task.id}")
+            response = self._sync(commands)
+        except Exception as e:
+            logging.error(f"Todoist batch of {len(commands)} failed: {str(e)}")
+            return [{"error": str(e)} for _ in commands]
+        
+        sync_status = response.get("sync_status", {})
+        temp_id_mapping = response.get("temp_id_mapping", {})
+        
+        results = []
+        for command in commands:
+            status = sync_status.get(command["uuid"])
+            task_id = temp_id_mapping.get(command["temp_id"])
+            if status == "ok" and task_id:
+                results.append({
+                    "id": task_id,
+                    "url": f"https://todoist.com/showTask?id={task_id}",
+                    "content": command["args"]["content"],
+                    "priority": command["args"]["priority"]
+                })
+            elif status == "ok":
+                # A replayed command Todoist had already applied: the task exists, its id is not returned
+                results.append({
+                    "id": None,
+                    "url": None,
+                    "content": command["args"]["content"],
+                    "priority": command["args"]["priority"],
+                    "replayed": True
+                })
+            else:
+                error = status.get("error") if isinstance(status, dict) else "no status returned"
+                results.append({"error": f"Todoist rejected task: {error}"})
+        
+        logging.info(
+            f"Todoist batch: {sum('error' not in r for r in results)}/{len(results)} tasks created"
+        )
+        return results
+    
+    def _sync(self, commands: List[Dict]) -> Dict:
+        """POST commands to the Sync API, retrying transient failures with jittered backoff"""
+        payload = {"commands": json.dumps(commands)}
+        
+        for attempt in range(Config.TODOIST_MAX_RETRIES + 1):
+            retry_after = None
+            try:
+                with stage_timer("todoist"):
+                    response = self.session.post(Config.TODOIST_SYNC_URL, data=payload)
+                if response.status_code not in RETRYABLE_STATUS:
+                    response.raise_for_status()
+                    return response.json()
+                error = f"HTTP {response.status_code}"
+                retry_after = response.headers.get("Retry-After")
+            except httpx.TransportError as e:
+                error = f"{type(e).__name__}: {str(e)}"
             
-            return {
-                "id": task.id,
-                "url": task.url,
-                "content": task.content,
-                "priority": priority
-            }
+            if attempt == Config.TODOIST_MAX_RETRIES:
+                break
             
-        except Exception as e:
-            logging.error(f"Error creating Todoist task: {str(e)}")
-            raise
\ No newline at end of file
+            # Full jitter, unless the server told us how long to wait (capped like the backoff)
+            delay = random.uniform(0, min(
+                Config.TODOIST_BACKOFF_MAX_SECONDS,
+                Config.TODOIST_BACKOFF_BASE_SECONDS * (2 ** attempt)
+            ))
+            if retry_after and retry_after.isdigit():
+                delay = min(float(retry_after), Config.TODOIST_BACKOFF_MAX_SECONDS)
+            logging.warning(f"Todoist sync failed ({error}), retry {attempt + 1} in {delay:.2f}s")
+            RETRIES.inc(service="todoist")
+            time.sleep(delay)
+        
+        raise RuntimeError(f"Todoist sync failed after {Config.TODOIST_MAX_RETRIES + 1} attempts: {error}")
+    
+    def close(self):
+        self.session.close()
+    
+    async def acreate_task(self, parsed_task: Dict, description: str) -> Dict:
+        """Async variant of create_task, run on the shared executor"""
+        return await run_blocking(self.create_task, parsed_task, description)
+    
+    async def acreate_tasks(self, items: List[Tuple[Dict, str]]) -> List[Dict]:
+        """Async variant of create_tasks, run on the shared executor"""
+        return await run_blocking(self.create_tasks, items)
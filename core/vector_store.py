@@ -0,0 +1,370 @@
+import json
+import logging
+import os
+import shutil
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from .config import Config
+
+logging.basicConfig(
+    filename=Config.LOG_FILE,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+VECTORS_FILE = "vectors.npy"
+SCALES_FILE = "scales.npy"
+META_FILE = "meta.json"
+
+
+class LocalEmbeddingFunction:
+    """sentence-transformers embedding function that does not import chromadb.
+
+    Same call signature and output as Chroma's SentenceTransformerEmbeddingFunction.
+    """
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return self.model.encode(list(input), convert_to_numpy=True, normalize_embeddings=False).tolist()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _quantize(vectors: np.ndarray):
+    # Symmetric per-row int8: row i is approximately quantized[i] * scales[i]
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def _matches(metadata: Dict, where: Dict) -> bool:
+    """Evaluate the subset of Chroma's where syntax used for category scopes"""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator == "$eq":
+                    ok = value == operand
+                elif operator == "$ne":
+                    ok = value != operand
+                elif operator == "$in":
+                    ok = value in operand
+                elif operator == "$nin":
+                    ok = value not in operand
+                else:
+                    raise ValueError(f"Unsupported where operator: {operator}")
+                if not ok:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class NumpyCollection:
+    """Chroma-compatible collection over one matrix of normalized embeddings.
+
+    Implements the part of the Chroma collection API RAGEngine uses (add,
+    get, query, count, modify). Rows are L2-normalized float32, or int8
+    with a per-row scale, so top-k for any number of queries is one matrix
+    product. Distances are squared L2 on the unit sphere (2 - 2·cos), the
+    scale of Chroma's default space, so RAG_MAX_DISTANCE applies as is.
+
+    With a directory, the matrix lives in vectors.npy (memory-mapped when
+    opened) next to a meta.json sidecar with ids, documents and metadata.
+    Adds are buffered and written out on the next read or modify, which
+    RAGEngine issues once when a generation is complete.
+    """
+
+    def __init__(self, name: str, directory: Optional[str] = None, dtype: str = "float32",
+                 metadata: Optional[Dict] = None):
+        self.name = name
+        self.directory = directory
+        self.dtype = dtype
+        self.metadata = metadata
+        self._ids = []
+        self._documents = []
+        self._metadatas = []
+        self._positions = {}  # id -> row
+        self._vectors = None  # (n, dim) float32 or int8, memory-mapped once saved
+        self._scales = None  # (n,) float32 for int8 rows
+        self._pending = []  # normalized float32 batches not yet merged into _vectors
+        self._masks = {}  # where-filter -> boolean row mask
+        # (mtime, size) of meta.json when opened from disk; None for a collection created here
+        self.opened_stat = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, name: str, directory: str) -> "NumpyCollection":
+        path = os.path.join(directory, META_FILE)
+        with open(path, 'r', encoding='utf-8') as f:
+            # Stat the open file: the sidecar is replaced atomically, so this is the version read
+            stat = os.fstat(f.fileno())
+            meta = json.load(f)
+        collection = cls(name, directory, meta["dtype"], meta.get("metadata"))
+        collection.opened_stat = (stat.st_mtime_ns, stat.st_size)
+        collection._ids = meta["ids"]
+        collection._documents = meta["documents"]
+        collection._metadatas = meta["metadatas"]
+        collection._positions = {chunk_id: row for row, chunk_id in enumerate(collection._ids)}
+        if collection._ids:
+            collection._vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+            if meta["dtype"] == "int8":
+                collection._scales = np.load(os.path.join(directory, SCALES_FILE))
+        return collection
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def add(self, ids: List[str], embeddings: List[List[float]], documents: List[str] = None,
+            metadatas: List[Dict] = None):
+        documents = documents or [""] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+        with self._lock:
+            keep = [i for i, chunk_id in enumerate(ids) if chunk_id not in self._positions]
+            if len(keep) < len(ids):
+                logging.warning(f"Ignoring {len(ids) - len(keep)} ids already in {self.name}")
+            if not keep:
+                return
+            vectors = np.asarray([embeddings[i] for i in keep], dtype=np.float32)
+            for i in keep:
+                self._positions[ids[i]] = len(self._ids)
+                self._ids.append(ids[i])
+                self._documents.append(documents[i])
+                self._metadatas.append(metadatas[i] or {})
+            self._pending.append(_normalize(vectors))
+            self._masks.clear()
+
+    def modify(self, name: Optional[str] = None, metadata: Optional[Dict] = None):
+        if name is not None:
+            raise ValueError("Renaming a NumPy collection is not supported")
+        with self._lock:
+            self.metadata = metadata
+            self._flush(save_meta=True)
+
+    def _flush(self, save_meta: bool = False):
+        # Called with the lock held
+        if self._pending:
+            fresh = np.concatenate(self._pending)
+            self._pending = []
+            if self.dtype == "int8":
+                fresh, scales = _quantize(fresh)
+                self._scales = scales if self._scales is None else np.concatenate([self._scales, scales])
+            self._vectors = fresh if self._vectors is None else np.concatenate([self._vectors, fresh])
+            save_meta = True
+        if save_meta and self.directory:
+            self._save()
+
+    def _save(self):
+        # Arrays first, sidecar last: a directory only counts once meta.json is written.
+        # Files are replaced atomically, so existing memory maps keep the old contents.
+        os.makedirs(self.directory, exist_ok=True)
+        if self._vectors is not None:
+            self._write_array(VECTORS_FILE, self._vectors)
+            if self._scales is not None:
+                self._write_array(SCALES_FILE, self._scales)
+            self._vectors = np.load(os.path.join(self.directory, VECTORS_FILE), mmap_mode="r")
+        meta = {
+            "dtype": self.dtype,
+            "metadata": self.metadata,
+            "ids": self._ids,
+            "documents": self._documents,
+            "metadatas": self._metadatas,
+        }
+        path = os.path.join(self.directory, META_FILE)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+
+    def _write_array(self, filename: str, array: np.ndarray):
+        path = os.path.join(self.directory, filename)
+        with open(path + ".tmp", 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(path + ".tmp", path)
+
+    def _snapshot(self):
+        with self._lock:
+            self._flush()
+            return self._vectors, self._scales
+
+    def _rows_as_float(self, rows: np.ndarray) -> np.ndarray:
+        vectors, scales = self._snapshot()
+        selected = np.asarray(vectors[rows], dtype=np.float32)
+        if scales is not None:
+            selected *= scales[rows][:, None]
+        return selected
+
+    def _mask(self, where: Dict) -> np.ndarray:
+        key = json.dumps(where, sort_keys=True)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = np.fromiter((_matches(metadata, where) for metadata in self._metadatas),
+                               dtype=bool, count=len(self._metadatas))
+            self._masks[key] = mask
+        return mask
+
+    def _check_exists(self):
+        # Memory maps outlive a deletion by another process; fail like Chroma does instead
+        # of quietly serving the dropped data
+        if self.directory and not os.path.isdir(self.directory):
+            raise ValueError(f"Collection {self.name} does not exist.")
+
+    def get(self, ids: Optional[List[str]] = None, include: List[str] = None) -> Dict:
+        self._check_exists()
+        include = ["metadatas", "documents"] if include is None else include
+        if ids is None:
+            rows = np.arange(len(self._ids))
+        else:
+            rows = np.asarray([self._positions[chunk_id] for chunk_id in ids if chunk_id in self._positions],
+                              dtype=np.int64)
+        result = {"ids": [self._ids[row] for row in rows], "embeddings": None, "documents": None, "metadatas": None}
+        if "documents" in include:
+            result["documents"] = [self._documents[row] for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [self._metadatas[row] for row in rows]
+        if "embeddings" in include:
+            result["embeddings"] = self._rows_as_float(rows).tolist() if len(rows) else []
+        return result
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10, where: Optional[Dict] = None,
+              include: List[str] = None) -> Dict:
+        """Top n_results rows per query embedding, nearest first"""
+        self._check_exists()
+        include = ["metadatas", "documents", "distances"] if include is None else include
+        vectors, scales = self._snapshot()
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+
+        candidates = None
+        if where and vectors is not None:
+            candidates = np.flatnonzero(self._mask(where))
+        size = 0 if vectors is None else (len(candidates) if candidates is not None else vectors.shape[0])
+        k = min(n_results, size)
+
+        if k == 0:
+            top = np.zeros((len(queries), 0), dtype=np.int64)
+            best = np.zeros((len(queries), 0), dtype=np.float32)
+        else:
+            matrix = vectors if candidates is None else vectors[candidates]
+            # int8 rows are upcast by the product itself; float32 rows are read straight from the map
+            scores = queries @ matrix.T
+            if scales is not None:
+                scores *= scales if candidates is None else scales[candidates]
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-best, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            best = np.take_along_axis(best, order, axis=1)
+            if candidates is not None:
+                top = candidates[top]
+
+        result = {
+            "ids": [[self._ids[row] for row in rows] for rows in top],
+            "embeddings": None, "documents": None, "metadatas": None, "distances": None,
+        }
+        if "documents" in include:
+            result["documents"] = [[self._documents[row] for row in rows] for rows in top]
+        if "metadatas" in include:
+            result["metadatas"] = [[self._metadatas[row] for row in rows] for rows in top]
+        if "distances" in include:
+            result["distances"] = np.maximum(0.0, 2.0 - 2.0 * best).tolist()
+        if "embeddings" in include:
+            result["embeddings"] = [self._rows_as_float(rows).tolist() for rows in top]
+        return result
+
+
+class NumpyVectorClient:
+    """Chroma-client-shaped registry of NumpyCollections.
+
+    With a path each collection is a subdirectory of it; an empty path
+    keeps everything in memory, like chromadb.Client().
+    """
+
+    def __init__(self, path: str = "", dtype: str = None):
+        self.path = path
+        self.dtype = dtype or Config.NUMPY_STORE_DTYPE
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def _directory(self, name: str) -> Optional[str]:
+        return os.path.join(self.path, name) if self.path else None
+
+    def create_collection(self, name: str, embedding_function=None, metadata: Optional[Dict] = None):
+        with self._lock:
+            directory = self._directory(name)
+            if name in self._collections or (directory and os.path.exists(directory)):
+                raise ValueError(f"Collection {name} already exists.")
+            collection = NumpyCollection(name, directory, self.dtype, metadata)
+            if directory:
+                os.makedirs(directory)
+                # Sidecar right away, so other processes can read the build's metadata
+                collection._save()
+            self._collections[name] = collection
+            return collection
+
+    def get_collection(self, name: str, embedding_function=None):
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None or self._changed_on_disk(collection):
+                directory = self._directory(name)
+                if not directory or not os.path.exists(os.path.join(directory, META_FILE)):
+                    raise ValueError(f"Collection {name} does not exist.")
+                collection = self._collections[name] = NumpyCollection.open(name, directory)
+            return collection
+
+    @staticmethod
+    def _changed_on_disk(collection: NumpyCollection) -> bool:
+        """Whether another process rewrote a collection this one opened, e.g. finished building it"""
+        if collection.opened_stat is None:
+            return False
+        try:
+            stat = os.stat(os.path.join(collection.directory, META_FILE))
+            return (stat.st_mtime_ns, stat.st_size) != collection.opened_stat
+        except OSError:
+            return False
+
+    def get_or_create_collection(self, name: str, embedding_function=None, metadata: Optional[Dict] = None):
+        try:
+            return self.get_collection(name, embedding_function)
+        except ValueError:
+            return self.create_collection(name, embedding_function, metadata)
+
+    def delete_collection(self, name: str):
+        with self._lock:
+            known = self._collections.pop(name, None)
+            directory = self._directory(name)
+            if directory and os.path.isdir(directory):
+                shutil.rmtree(directory)
+            elif known is None:
+                raise ValueError(f"Collection {name} does not exist.")
+
+    def list_collections(self) -> List[NumpyCollection]:
+        if self.path:
+            with self._lock:
+                # Forget collections another process deleted
+                for name in [name for name in self._collections if not os.path.isdir(self._directory(name))]:
+                    del self._collections[name]
+        names = set(self._collections)
+        if self.path and os.path.isdir(self.path):
+            names.update(entry.name for entry in os.scandir(self.path) if entry.is_dir())
+        collections = []
+        for name in sorted(names):
+            try:
+                collections.append(self.get_collection(name))
+            except ValueError:
+                # Directory of a build that never wrote its sidecar
+                collections.append(NumpyCollection(name, self._directory(name), self.dtype))
+        return collections
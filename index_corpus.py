@@ -0,0 +1,34 @@
+import argparse
+import logging
+from core.config import Config
+from core.rag_engine import RAGEngine
+
+logging.basicConfig(
+    filename=Config.LOG_FILE,
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+def main():
+    parser = argparse.ArgumentParser(description="Index a directory of SOP documents")
+    parser.add_argument("directory", nargs="?", default=Config.SOP_DIR)
+    parser.add_argument("--pattern", default="*.txt", help="File name pattern to index")
+    parser.add_argument("--workers", type=int, default=Config.INGEST_WORKERS, help="Chunking processes")
+    args = parser.parse_args()
+
+    def report(stats):
+        print(
+            f"files {stats['files_done']}/{stats['files_total']}, "
+            f"chunks embedded {stats['chunks_embedded']}/{stats['chunks_total']}",
+            end="\r"
+        )
+
+    rag = RAGEngine()
+    stats = rag.load_corpus(args.directory, pattern=args.pattern, workers=args.workers, progress=report)
+    print(
+        f"\nIndexed {stats['chunks_total']} chunks from {stats['files_total']} files "
+        f"in {stats['seconds']}s ({stats['chunks_per_second']} chunks/s)"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
+import asyncio
 import logging
+import time
 from telegram import Update
+from telegram.error import BadRequest, Forbidden
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
@@ -11,7 +14,10 @@ from telegram.ext import (
 from core.config import Config
 from core.task_processor import TaskProcessor
 from core.todoist_client import TodoistClient
-from core.rag_engine import RAGEngine
+from core.rag_engine import get_shared_engine
+from core.job_queue import JobQueue, JobWorkerPool, set_job_components
+from core.async_utils import run_blocking
+from core.metrics import start_metrics_server, start_trace
 
 # ---------------- LOGGING ----------------
 logging.basicConfig(
@@ -20,19 +26,92 @@ logging.basicConfig(
 )
 
 # ---------------- GLOBAL COMPONENTS ----------------
-rag_engine = RAGEngine()
-processor = TaskProcessor(rag_engine)
-todoist_client = TodoistClient()
+# Created by init_components() at startup so the model is warm before polling
+rag_engine = None
+processor = None
+todoist_client = None
+# Set when JOB_QUEUE_ENABLED; task requests are then enqueued and answered by delivery
+job_queue = None
+JOB_CHANNEL = "telegram"
 
-rag_loaded = False
+STREAM_EDIT_INTERVAL = 1.0  # seconds between edits, keeps us under Telegram's edit rate limit
+TELEGRAM_MESSAGE_LIMIT = 4096
 
 
 # ---------------- UTIL ----------------
-async def load_sop_if_needed():
-    global rag_loaded
-    if not rag_loaded:
-        rag_engine.load_sop("data/sop_expenses.txt")
-        rag_loaded = True
+def init_components():
+    global rag_engine, processor, todoist_client
+    rag_engine = get_shared_engine()
+    processor = TaskProcessor(rag_engine)
+    todoist_client = TodoistClient()
+
+
+class ProgressReporter:
+    """Sends progress replies in order in the background, so the pipeline
+    keeps working while Telegram round trips are in flight"""
+
+    def __init__(self, update: Update):
+        self.update = update
+        self._last = None
+
+    def send(self, text: str):
+        previous = self._last
+
+        async def _send():
+            if previous is not None:
+                await previous
+            try:
+                await self.update.message.reply_text(text)
+            except Exception as e:
+                logging.warning(f"Progress message failed: {str(e)}")
+
+        self._last = asyncio.create_task(_send())
+
+    async def flush(self):
+        if self._last is not None:
+            await self._last
+
+
+async def stream_reply(update: Update, header: str, tokens, progress: ProgressReporter = None) -> str:
+    """Render streamed tokens by progressively editing a single message.
+
+    With a progress reporter, the first token is requested before pending
+    progress replies are flushed, so the completion starts immediately while
+    the streamed message still appears after them.
+    """
+    tokens = tokens.__aiter__()
+    first = asyncio.ensure_future(tokens.__anext__())
+    if progress is not None:
+        await progress.flush()
+
+    async def ordered():
+        try:
+            yield await first
+        except StopAsyncIteration:
+            return
+        async for token in tokens:
+            yield token
+
+    message = await update.message.reply_text(header + "...")
+    text = ""
+    shown = ""
+    last_edit = time.monotonic()
+
+    async for token in ordered():
+        text += token
+        if time.monotonic() - last_edit >= STREAM_EDIT_INTERVAL:
+            current = (header + text)[:TELEGRAM_MESSAGE_LIMIT]
+            # Past the length limit the visible text stops changing, and Telegram
+            # rejects an edit that does not change the message
+            if current != shown:
+                shown = current
+                await message.edit_text(shown)
+            last_edit = time.monotonic()
+
+    final = (header + text)[:TELEGRAM_MESSAGE_LIMIT]
+    if final != shown:
+        await message.edit_text(final)
+    return text
 
 
 # ---------------- COMMANDS ----------------
@@ -65,13 +144,22 @@ async def ask_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ---------------- MESSAGE ROUTER ----------------
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await load_sop_if_needed()
+    if processor is None or not rag_engine.ready:
+        await update.message.reply_text("Knowledge base is still loading, please try again shortly.")
+        return
 
     text = update.message.text
     mode = context.user_data.get("mode")
+    # Each update runs in its own asyncio task, so the trace is scoped to it
+    start_trace()
+    # Repeats of the same request from this user in this chat are deduplicated
+    scope = f"telegram:{update.effective_chat.id}:{update.effective_user.id}"
 
-    if mode == "task":
-        await process_task(update, text)
+    if mode == "task" and job_queue is not None:
+        await enqueue_task(update, text, scope)
+
+    elif mode == "task":
+        await process_task(update, text, scope)
 
     elif mode == "ask":
         await answer_question(update, text)
@@ -85,72 +173,139 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 # ---------------- TASK FLOW ----------------
-async def process_task(update: Update, request: str):
-    await update.message.reply_text(" Parsing request...")
-
-    parsed = processor.parse_request(request)
-    logging.info(f"Parsed task: {parsed}")
+async def process_task(update: Update, request: str, scope: str = None):
+    progress = ProgressReporter(update)
+    progress.send(" Parsing request...")
+
+    result = await processor.aprepare_task(request, scope)
+    if result.duplicate:
+        await progress.flush()
+        await reply_duplicate(update, result)
+        return
+    # Released if the handler fails or is cancelled before acreate_task settles it
+    try:
+        parsed = result.parsed
+        logging.info(f"Parsed task: {parsed}")
+
+        progress.send(
+            " Parsed Task\n"
+            f"Title: {parsed['title']}\n"
+            f"Category: {parsed['category']}\n"
+            f"Priority: {parsed.get('priority')}\n"
+            f"Deadline: {parsed.get('deadline_hint')}"
+        )
 
-    await update.message.reply_text(
-        " Parsed Task\n"
-        f"Title: {parsed['title']}\n"
-        f"Category: {parsed['category']}\n"
-        f"Priority: {parsed.get('priority')}\n"
-        f"Deadline: {parsed.get('deadline_hint')}"
-    )
+        if result.sop_chunks:
+            sop_preview = "\n\n".join(
+                f"- {chunk['document'][:150]}..." for chunk in result.sop_chunks
+            )
+            progress.send(" Relevant SOP\n" + sop_preview)
+        else:
+            progress.send(" No relevant SOP found.")
+
+        await stream_reply(
+            update,
+            " Enriched Description\n",
+            processor.astream_enrichment(result),
+            progress
+        )
 
-    await update.message.reply_text(" Searching SOP...")
-    sop_chunks = processor.rag_engine.query(
-        f"{parsed['category']} {parsed['title']}",
-        n_results=3
-    )
+        progress.send(" Creating Todoist task...")
+        await processor.acreate_task(result, todoist_client)
+    finally:
+        await run_blocking(processor.release_unsettled, result)
+    await progress.flush()
 
-    if sop_chunks:
-        sop_preview = "\n\n".join(
-            f"- {chunk[:150]}..." for chunk in sop_chunks
-        )
+    if result.error:
         await update.message.reply_text(
-            " Relevant SOP\n" + sop_preview
+            " Failed to create task.\n"
+            f"Reason: {result.error}"
         )
-    else:
-        await update.message.reply_text(" No relevant SOP found.")
+        return
+
+    task = result.task
+    await update.message.reply_text(
+        "Task Created Successfully!\n\n"
+        f"Title: {task['content']}\n"
+        f"Priority: P{task['priority']}\n"
+        f"Todoist URL:\n{task['url']}\n\n"
+        f"Processed in {result.timings['total']:.1f}s"
+    )
 
-    await update.message.reply_text(" Generating enriched description...")
-    enriched_desc = processor.enrich_with_sop(parsed)
 
+async def reply_duplicate(update: Update, result):
+    if result.duplicate == "pending":
+        await update.message.reply_text(" This request is already being processed.")
+        return
+    task = result.task
     await update.message.reply_text(
-        " Enriched Description\n"
-        + enriched_desc
+        "This request was already processed, no new task was created.\n\n"
+        f"Title: {task['content']}\n"
+        f"Priority: P{task['priority']}\n"
+        f"Todoist URL:\n{task['url']}"
     )
 
-    await update.message.reply_text(" Creating Todoist task...")
 
-    try:
-        task = todoist_client.create_task(parsed, enriched_desc)
+# ---------------- QUEUED TASK FLOW ----------------
+async def enqueue_task(update: Update, request: str, scope: str = None):
+    job_id = await run_blocking(
+        job_queue.enqueue,
+        "task",
+        {"message": request, "chat_id": update.effective_chat.id, "scope": scope},
+        JOB_CHANNEL
+    )
+    await update.message.reply_text(
+        f" Request queued as job #{job_id}. I'll send the result here when it's done."
+    )
 
-        await update.message.reply_text(
-            "Task Created Successfully!\n\n"
-            f"Title: {task['content']}\n"
-            f"Priority: P{task['priority']}\n"
-            f"Todoist URL:\n{task['url']}"
-        )
 
-    except Exception as e:
-        logging.exception("Todoist task creation failed")
-        await update.message.reply_text(
-            " Failed to create task.\n"
-            f"Reason: {str(e)}"
+def format_job_result(job: dict) -> str:
+    if job["status"] != "done":
+        return (
+            f" Job #{job['id']} failed after {job['attempts']} attempts.\n"
+            f"Reason: {job['error']}"
         )
+    result = job["result"]
+    task = result["task"]
+    return (
+        f"Task Created Successfully! (job #{job['id']})\n\n"
+        f"Title: {task['content']}\n"
+        f"Priority: P{task['priority']}\n"
+        f"Todoist URL:\n{task['url']}\n\n"
+        f"{result['enriched_description']}"
+    )[:TELEGRAM_MESSAGE_LIMIT]
+
+
+async def deliver_job_results(app):
+    """Push finished jobs back to the chats that requested them"""
+    while True:
+        try:
+            jobs = await run_blocking(job_queue.take_finished, JOB_CHANNEL)
+        except Exception:
+            logging.exception("Job result delivery failed")
+            jobs = []
+        for job in jobs:
+            try:
+                await app.bot.send_message(chat_id=job["payload"]["chat_id"], text=format_job_result(job))
+            except (BadRequest, Forbidden):
+                # The chat is gone or blocked the bot; retrying cannot deliver it
+                logging.exception(f"Dropping result of job {job['id']}")
+            except Exception:
+                logging.exception(f"Delivering result of job {job['id']} failed, will retry")
+                continue
+            try:
+                await run_blocking(job_queue.mark_notified, job["id"])
+            except Exception:
+                logging.exception(f"Could not mark job {job['id']} as delivered")
+        await asyncio.sleep(Config.JOB_POLL_INTERVAL_SECONDS)
 
 
 # ---------------- Q&A FLOW ----------------
 async def answer_question(update: Update, question: str):
-    await update.message.reply_text(" Searching SOP...")
-    answer = processor.answer_question(question)
-
-    await update.message.reply_text(
-        " Answer\n"
-        + answer
+    await stream_reply(
+        update,
+        " Answer\n",
+        processor.aanswer_question_stream(question)
     )
 
 
@@ -164,12 +319,32 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
 
 
 # ---------------- BOOTSTRAP ----------------
+async def start_job_delivery(app):
+    app.create_task(deliver_job_results(app))
+
+
 def run_bot():
+    global job_queue
     Config.validate()
+    init_components()
+    rag_engine.start_watching()
+    start_metrics_server()
+    logging.info(f"Knowledge base ready: {rag_engine.readiness()}")
 
-    app = ApplicationBuilder() \
+    # Handlers run concurrently; blocking work is bounded by the shared executor
+    builder = ApplicationBuilder() \
         .token(Config.TELEGRAM_BOT_TOKEN) \
-        .build()
+        .concurrent_updates(Config.MAX_CONCURRENT_REQUESTS)
+
+    workers = None
+    if Config.JOB_QUEUE_ENABLED:
+        job_queue = JobQueue()
+        set_job_components(processor, todoist_client)
+        workers = JobWorkerPool()
+        workers.start()
+        builder = builder.post_init(start_job_delivery)
+
+    app = builder.build()
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("task", task_command))
@@ -179,7 +354,11 @@ def run_bot():
     app.add_error_handler(error_handler)
 
     logging.info("Telegram bot started")
-    app.run_polling()
+    try:
+        app.run_polling()
+    finally:
+        if workers is not None:
+            workers.stop()
 
 if __name__ == "__main__":
     run_bot()
\ No newline at end of file